@@ -0,0 +1,95 @@
+"""
+Dynamic request batching for engines that can process several sections in one call.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# How long the first request of a batch waits for more requests to join it
+DEFAULT_MAX_WAIT_MS = 50
+
+class EngineBatcher:
+    """
+    Collects concurrent single-item requests into a pool and runs them through one batch function call.
+    batch_fn(payloads) receives up to batch_size payloads and returns None or a list of per-payload results;
+    a result that is an Exception fails only that request, an exception raised by batch_fn fails the whole batch.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Any]], Optional[List[Any]]], batch_size: int = 8,
+                 max_wait_ms: float = DEFAULT_MAX_WAIT_MS, name: str = "avp-batcher"):
+        self._batch_fn = batch_fn
+        self.batch_size = max(1, batch_size)
+        self._max_wait = max_wait_ms / 1000
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, payload: Any) -> Future:
+        """Queue payload for the next batch and return a Future for its result."""
+        if self._closed:
+            raise RuntimeError("EngineBatcher is closed")
+        future: Future = Future()
+        self._queue.put((payload, future))
+        return future
+
+    def close(self) -> None:
+        """Run the requests already queued, then stop the worker thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self._max_wait
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._dispatch(batch)
+            if stop:
+                return
+
+    def _dispatch(self, batch) -> None:
+        batch = [(payload, future) for payload, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self._batch_fn([payload for payload, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        if results is None:
+            results = [None] * len(batch)
+        elif len(results) != len(batch):
+            error = RuntimeError(f"Batch function returned {len(results)} results for {len(batch)} requests")
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        logger.debug(f"Ran a batch of {len(batch)} requests")
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -4,19 +4,26 @@ Configuration management for the video production pipeline.
 
 import os
 from dataclasses import dataclass, field
+from functools import lru_cache
 from typing import Dict, Any, Optional
 from pathlib import Path
 from dotenv import load_dotenv
 
-@dataclass
+@lru_cache(maxsize=1)
+def load_env_once() -> bool:
+    """Load .env into the process environment on the first call only; engines call this per request."""
+    return load_dotenv()
+
+@dataclass(slots=True, frozen=True)
 class TTSConfig:
     """Text-to-Speech configuration."""
     engine: str = "espeak"
     model: Optional[str] = None
     voice: Optional[str] = None
     fallback_engine: str = "espeak"
+    batch_size: int = 8  # max sections per call for engines that define a batch() function
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ImageConfig:
     """Image generation configuration."""
     engine: str = "dalle"
@@ -24,8 +31,9 @@ class ImageConfig:
     size: str = "1024x1024"
     quality: str = "standard"
     fallback_engine: str = "unsplash"
+    batch_size: int = 4  # max images per call for engines that define a batch() function
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class VideoConfig:
     """Video assembly configuration."""
     resolution: tuple = (1280, 720)
@@ -33,8 +41,13 @@ class VideoConfig:
     video_codec: str = "libx264"
     audio_codec: str = "aac"
     pixel_format: str = "yuv420p"
+    x264_preset: str = "veryfast"
+    x264_tune: Optional[str] = "stillimage"
+    encode_threads: int = 0  # 0 = auto (per-process share of the CPU cores)
+    hw_encoder: Optional[str] = None  # opt-in: "auto" probes ffmpeg for NVENC/VideoToolbox, or an encoder name
+    fast_still_image: bool = True  # per-section segments: ultrafast still-image encode with uniform, concat-copy-safe streams
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PipelineConfig:
     """Main pipeline configuration."""
     # API Keys
@@ -50,6 +63,10 @@ class PipelineConfig:
     default_model: str = "models/gemini-1.5-pro-latest"
     temp_dir_name: str = "temp_segments"
     final_video_name: str = "final_video.mp4"
+    io_workers: int = 0  # TTS/image API calls; 0 = the requested max_workers (not limited by the CPU count)
+    cpu_workers: int = 0  # ffmpeg encodes; 0 = os.cpu_count()
+    content_cache_max_mb: int = 500  # generated audio/images kept for reuse; least recently used files go first
+    image_cache_max_mb: int = 500  # downloaded images kept for reuse, pruned the same way
     
     # File patterns
     audio_pattern: str = "{idx:02d}_{heading}.wav"
@@ -59,12 +76,14 @@ class PipelineConfig:
     # Logging
     log_level: str = "INFO"
     
-    def __post_init__(self):
-        """Load environment variables after initialization."""
-        load_dotenv()
-        self.gemini_api_key = self.gemini_api_key or os.getenv("GEMINI_API_KEY")
-        self.openai_api_key = self.openai_api_key or os.getenv("OPENAI_API_KEY")
+    @classmethod
+    def from_env(cls, **overrides) -> "PipelineConfig":
+        """Build a config whose API keys come from the environment (and .env) unless given explicitly."""
+        load_env_once()
+        overrides["gemini_api_key"] = overrides.get("gemini_api_key") or os.getenv("GEMINI_API_KEY")
+        overrides["openai_api_key"] = overrides.get("openai_api_key") or os.getenv("OPENAI_API_KEY")
+        return cls(**overrides)
 
 def load_config() -> PipelineConfig:
     """Load configuration from environment and defaults."""
-    return PipelineConfig() 
\ No newline at end of file
+    return PipelineConfig.from_env() 
\ No newline at end of file
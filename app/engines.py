@@ -2,15 +2,39 @@
 Engine management for TTS and image generation.
 """
 
+import inspect
 import logging
+import sys
+import threading
 from typing import Dict, Any, Optional, Callable
 from pathlib import Path
+from app.batching import EngineBatcher
 from app.config import PipelineConfig, TTSConfig, ImageConfig
-from app.utils import discover_plugins
+from app.utils import LazyPlugin, discover_plugins
 import os
 
 logger = logging.getLogger(__name__)
 
+# Optional module-level function an engine plugin can define to process many sections per call:
+# TTS: batch(items, model, voice); image: batch(items, model, size, quality); items are (text, output_path) pairs
+BATCH_FUNCTION = "batch"
+
+def _batch_function(engine: Callable) -> Optional[Callable]:
+    """Return the batch entry point of the plugin module that defines engine, if it has one."""
+    module = engine.module if isinstance(engine, LazyPlugin) else sys.modules.get(engine.__module__)
+    return getattr(module, BATCH_FUNCTION, None)
+
+def _positional_arity(engine: Callable) -> int:
+    """Number of positional arguments engine accepts (a large number for *args); the plugin is imported if needed."""
+    func = engine.load() if isinstance(engine, LazyPlugin) else engine
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        return sys.maxsize
+    if any(p.kind is p.VAR_POSITIONAL for p in params):
+        return sys.maxsize
+    return sum(p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD) for p in params)
+
 class EngineManager:
     """Manages TTS and image generation engines with fallbacks."""
     
@@ -18,6 +42,9 @@ class EngineManager:
         self.config = config
         self.tts_engines = self._load_tts_engines()
         self.image_engines = self._load_image_engines()
+        self._batchers: Dict[tuple, EngineBatcher] = {}
+        self._batchers_lock = threading.Lock()
+        self._image_arity: Dict[str, int] = {}
     
     def _load_tts_engines(self) -> Dict[str, Callable]:
         """Dynamically load available TTS engines as plugins."""
@@ -26,7 +53,7 @@ class EngineManager:
         if not plugins:
             raise RuntimeError("No TTS engines available")
         logger.info(f"Available TTS engines: {list(plugins.keys())}")
-        return plugins
+        return {name.lower(): engine for name, engine in plugins.items()}
     
     def _load_image_engines(self) -> Dict[str, Callable]:
         """Dynamically load available image generation engines as plugins."""
@@ -35,17 +62,17 @@ class EngineManager:
         if not plugins:
             raise RuntimeError("No image engines available")
         logger.info(f"Available image engines: {list(plugins.keys())}")
-        return plugins
+        return {name.lower(): engine for name, engine in plugins.items()}
     
-    def generate_tts(self, text: str, output_path: Path, config: TTSConfig) -> bool:
-        """Generate TTS audio with fallback support."""
+    def generate_tts(self, text: str, output_path: Path, config: TTSConfig) -> str:
+        """Generate TTS audio with fallback support; returns the name of the engine that produced it."""
         engine_name = config.engine.lower()
         
         # Try primary engine
         if engine_name in self.tts_engines:
             try:
-                self.tts_engines[engine_name](text, str(output_path), config.model, config.voice)
-                return True
+                self._call_tts(engine_name, text, output_path, config)
+                return engine_name
             except Exception as e:
                 logger.warning(f"Primary TTS engine {engine_name} failed: {e}")
         
@@ -54,8 +81,8 @@ class EngineManager:
         if fallback_name in self.tts_engines and fallback_name != engine_name:
             try:
                 logger.info(f"Using fallback TTS engine: {fallback_name}")
-                self.tts_engines[fallback_name](text, str(output_path), config.model, config.voice)
-                return True
+                self._call_tts(fallback_name, text, output_path, config)
+                return fallback_name
             except Exception as e:
                 logger.error(f"Fallback TTS engine {fallback_name} also failed: {e}")
         
@@ -63,22 +90,15 @@ class EngineManager:
         available_engines = list(self.tts_engines.keys())
         raise RuntimeError(f"No working TTS engine. Available: {available_engines}")
     
-    def generate_image(self, prompt: str, output_path: Path, config: ImageConfig) -> bool:
-        """Generate image with fallback support."""
+    def generate_image(self, prompt: str, output_path: Path, config: ImageConfig) -> str:
+        """Generate image with fallback support; returns the name of the engine that produced it."""
         engine_name = config.engine.lower()
         
         # Try primary engine
         if engine_name in self.image_engines:
             try:
-                # Try to call with all possible params, fallback to less if needed
-                try:
-                    self.image_engines[engine_name](prompt, str(output_path), config.model, config.size, config.quality)
-                except TypeError:
-                    try:
-                        self.image_engines[engine_name](prompt, str(output_path), config.model)
-                    except TypeError:
-                        self.image_engines[engine_name](prompt, str(output_path))
-                return True
+                self._call_image(engine_name, prompt, output_path, config)
+                return engine_name
             except Exception as e:
                 logger.warning(f"Primary image engine {engine_name} failed: {e}")
         
@@ -87,20 +107,61 @@ class EngineManager:
         if fallback_name in self.image_engines and fallback_name != engine_name:
             try:
                 logger.info(f"Using fallback image engine: {fallback_name}")
-                try:
-                    self.image_engines[fallback_name](prompt, str(output_path), config.model, config.size, config.quality)
-                except TypeError:
-                    try:
-                        self.image_engines[fallback_name](prompt, str(output_path), config.model)
-                    except TypeError:
-                        self.image_engines[fallback_name](prompt, str(output_path))
-                return True
+                self._call_image(fallback_name, prompt, output_path, config)
+                return fallback_name
             except Exception as e:
                 logger.error(f"Fallback image engine {fallback_name} also failed: {e}")
         
         # If no engines work, raise error
         available_engines = list(self.image_engines.keys())
         raise RuntimeError(f"No working image engine. Available: {available_engines}")
+
+    def _call_tts(self, engine_name: str, text: str, output_path: Path, config: TTSConfig) -> None:
+        engine = self.tts_engines[engine_name]
+        batch_fn = _batch_function(engine)
+        if batch_fn is None:
+            engine(text, str(output_path), config.model, config.voice)
+            return
+        key = ('tts', engine_name, config.model, config.voice)
+        batcher = self._get_batcher(key, lambda items: batch_fn(items, config.model, config.voice), config.batch_size)
+        batcher.submit((text, str(output_path))).result()
+
+    def _call_image(self, engine_name: str, prompt: str, output_path: Path, config: ImageConfig) -> None:
+        engine = self.image_engines[engine_name]
+        batch_fn = _batch_function(engine)
+        if batch_fn is not None:
+            key = ('image', engine_name, config.model, config.size, config.quality)
+            batcher = self._get_batcher(key, lambda items: batch_fn(items, config.model, config.size, config.quality),
+                                        config.batch_size)
+            batcher.submit((prompt, str(output_path))).result()
+            return
+        # Pass as many of (model, size, quality) as the plugin signature accepts, inspected once per engine
+        arity = self._image_arity.get(engine_name)
+        if arity is None:
+            arity = self._image_arity[engine_name] = _positional_arity(engine)
+        if arity >= 5:
+            engine(prompt, str(output_path), config.model, config.size, config.quality)
+        elif arity >= 3:
+            engine(prompt, str(output_path), config.model)
+        else:
+            engine(prompt, str(output_path))
+
+    def _get_batcher(self, key: tuple, batch_fn: Callable, batch_size: int) -> EngineBatcher:
+        """Return the batcher for an (engine, settings) key, starting it on first use."""
+        with self._batchers_lock:
+            batcher = self._batchers.get(key)
+            if batcher is None:
+                batcher = EngineBatcher(batch_fn, batch_size=batch_size, name=f"avp-batch-{key[0]}-{key[1]}")
+                self._batchers[key] = batcher
+            return batcher
+
+    def close(self) -> None:
+        """Stop the batch worker threads."""
+        with self._batchers_lock:
+            batchers = list(self._batchers.values())
+            self._batchers.clear()
+        for batcher in batchers:
+            batcher.close()
     
     def get_available_engines(self) -> Dict[str, list]:
         """Get list of available engines."""
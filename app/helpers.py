@@ -2,30 +2,65 @@
 Helper functions for the video production pipeline.
 """
 
+import datetime
 import os
+import re
+import shutil
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from itertools import accumulate
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from app import image_cache, llm_cache
 
-def build_prompt(input_data):
-    """Build a prompt string for the script generation step from input data, with explicit instructions for structured output."""
-    topic = input_data.get("topic", "")
-    keywords = input_data.get("keywords", [])
-    prompt = input_data.get("prompt", "")
-    lines = [
-        "You are an expert children's scriptwriter.",
-        "Write a fun, educational script for a video on the following topic, split into clear sections.",
-        "Return the result as a JSON array, where each item has these fields: heading (string), narration (string), and duration (number, estimated seconds).",
-        "Do NOT include markdown, code blocks, or image prompts in the narration.",
-        "Example output:",
-        '[',
-        '  {',
-        '    "heading": "Section Title",',
-        '    "narration": "A concise, engaging narration for this section.",',
-        '    "duration": 12',
-        '  },',
-        '  ...',
-        ']',
-        "---",
-    ]
+try:
+    import httpx
+    import h2  # noqa: F401  (required by httpx for HTTP/2)
+except ImportError:
+    httpx = None
+
+WORDS_PER_MINUTE = 140  # average speaking rate
+
+# Static part of the script generation prompt; only the topic/keywords/prompt lines vary per call
+_PROMPT_PREAMBLE = "\n".join([
+    "You are an expert children's scriptwriter.",
+    "Write a fun, educational script for a video on the following topic, split into clear sections.",
+    "Return the result as a JSON array, where each item has these fields: heading (string), narration (string), and duration (number, estimated seconds).",
+    "Do NOT include markdown, code blocks, or image prompts in the narration.",
+    "Example output:",
+    '[',
+    '  {',
+    '    "heading": "Section Title",',
+    '    "narration": "A concise, engaging narration for this section.",',
+    '    "duration": 12',
+    '  },',
+    '  ...',
+    ']',
+    "---",
+])
+
+_SECTION_SPLIT = re.compile(r'\n\n|\n\d+\. ')
+_IMG_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+
+_http_session = None
+_unsplash_session = None
+_gemini_models = {}
+_gemini_configured = False
+_gemini_lock = threading.Lock()
+
+def build_static_preamble():
+    """Return the invariant instruction block of the script generation prompt."""
+    return _PROMPT_PREAMBLE
+
+def build_dynamic_suffix(input_data):
+    """Return the per-request part of the script generation prompt (topic, keywords, prompt)."""
+    return _dynamic_suffix(input_data.get("topic", ""), tuple(input_data.get("keywords", [])), input_data.get("prompt", ""))
+
+@lru_cache(maxsize=256)
+def _dynamic_suffix(topic, keywords, prompt):
+    lines = []
     if topic:
         lines.append(f"Topic: {topic}")
     if keywords:
@@ -34,17 +69,33 @@ def build_prompt(input_data):
         lines.append(f"Prompt: {prompt}")
     return "\n".join(lines)
 
+def build_prompt(input_data):
+    """Build a prompt string for the script generation step from input data, with explicit instructions for structured output."""
+    suffix = build_dynamic_suffix(input_data)
+    if not suffix:
+        return _PROMPT_PREAMBLE
+    return _PROMPT_PREAMBLE + "\n" + suffix
+
+@lru_cache(maxsize=1024)
 def estimate_duration(text):
-    """Estimate duration in seconds for a given narration text."""
+    """Estimate duration in seconds for a given narration text (memoized; narrations repeat across resumed runs)."""
     words = text.split()
-    words_per_minute = 140  # average speaking rate
-    minutes = len(words) / words_per_minute
+    minutes = len(words) / WORDS_PER_MINUTE
     return max(2, round(minutes * 60, 2))  # at least 2 seconds
 
+def estimate_durations(texts):
+    """Estimate durations in seconds for a batch of narration texts."""
+    return list(map(estimate_duration, texts))
+
 def create_prompt_from_section(section, topic, keywords):
-    """Create an image prompt from a section, topic, and keywords."""
-    heading = section.get('heading', '')
-    narration = section.get('narration', '')
+    """Create an image prompt from a section, topic, and keywords (memoized; retries and resumed runs repeat them)."""
+    return _section_prompt(section.get('heading', ''), section.get('narration', ''), topic, tuple(keywords or ()))
+
+@lru_cache(maxsize=256)
+def _section_prompt(heading, narration, topic, keywords):
+    # Common case: every field present, so skip building and filtering a parts list
+    if heading and narration and topic and keywords:
+        return f"{heading}. {narration}. {topic}. {', '.join(keywords)}".strip()
     prompt_parts = [heading, narration, topic]
     if keywords:
         prompt_parts.append(", ".join(keywords))
@@ -52,6 +103,9 @@ def create_prompt_from_section(section, topic, keywords):
 
 def ensure_section_consistency(sections, min_sections=2):
     """Ensure sections is a list of well-formed sections. Raise ValueError if not, or attempt to split/merge if possible."""
+    # Fast path: every section is already well-formed, so no filtered copy is needed
+    if len(sections) >= min_sections and all(isinstance(s, dict) and s.get('heading') and s.get('narration') for s in sections):
+        return sections
     # Remove empty or malformed sections
     valid_sections = [s for s in sections if isinstance(s, dict) and s.get('heading') and s.get('narration')]
     if len(valid_sections) >= min_sections:
@@ -59,9 +113,11 @@ def ensure_section_consistency(sections, min_sections=2):
     # Attempt to split a single long section by headings in narration (very basic)
     if len(valid_sections) == 1:
         narration = valid_sections[0]['narration']
-        # Split on double newlines or numbered headings
-        import re
-        parts = re.split(r'\n\n|\n\d+\. ', narration)
+        # Split on double newlines or numbered headings; numbered headings need digits, so skip the regex otherwise
+        if any(c.isdigit() for c in narration):
+            parts = _SECTION_SPLIT.split(narration)
+        else:
+            parts = narration.split('\n\n')
         if len(parts) > 1:
             return [
                 {
@@ -73,86 +129,208 @@ def ensure_section_consistency(sections, min_sections=2):
             ]
     raise ValueError("Script must have at least two well-formed sections.")
 
+@lru_cache(maxsize=1)
+def _run_timestamp():
+    """ISO timestamp of the first metadata enrichment in this process, shared by the whole run."""
+    return datetime.datetime.now().isoformat()
+
 def enrich_metadata(meta, input_data=None):
     """Ensure all recommended metadata fields are present, using input_data or defaults if needed."""
-    import datetime
     enriched = dict(meta) if meta else {}
+    input_data = input_data or {}
     enriched.setdefault('language', 'en')
-    enriched.setdefault('target_age', input_data.get('target_age', 'children') if input_data else 'children')
-    enriched.setdefault('tags', input_data.get('keywords', []) if input_data else [])
+    if 'target_age' not in enriched:
+        enriched['target_age'] = input_data.get('target_age', 'children')
+    if 'tags' not in enriched:
+        enriched['tags'] = input_data.get('keywords', [])
     enriched.setdefault('estimated_reading_level', 'unknown')
     enriched.setdefault('created_by', 'auto-pipeline')
-    enriched.setdefault('model', input_data.get('model', 'unknown') if input_data else 'unknown')
-    enriched.setdefault('generated_at', datetime.datetime.now().isoformat())
+    if 'model' not in enriched:
+        enriched['model'] = input_data.get('model', 'unknown')
+    if 'generated_at' not in enriched:
+        enriched['generated_at'] = _run_timestamp()
     return enriched
 
+def seconds_to_timestamp(seconds, ms_sep=","):
+    """Format seconds as an SRT timestamp (HH:MM:SS,mmm); pass ms_sep="." for WebVTT."""
+    s_total, ms = divmod(int(seconds * 1000), 1000)
+    m_total, s = divmod(s_total, 60)
+    h, m = divmod(m_total, 60)
+    return "%02d:%02d:%02d%s%03d" % (h, m, s, ms_sep, ms)
+
 def export_srt(sections, srt_path):
     """Export sections to SRT file. Assumes each section has 'heading', 'narration', and 'duration'."""
-    def seconds_to_timestamp(seconds):
-        h = int(seconds // 3600)
-        m = int((seconds % 3600) // 60)
-        s = int(seconds % 60)
-        ms = int((seconds - int(seconds)) * 1000)
-        return f"{h:02}:{m:02}:{s:02},{ms:03}"
-    lines = []
-    current_time = 0.0
-    for idx, section in enumerate(sections, 1):
-        start = seconds_to_timestamp(current_time)
-        end = seconds_to_timestamp(current_time + float(section.get('duration', 2)))
-        lines.append(f"{idx}\n{start} --> {end}\n[{section.get('heading', '')}]\n{section.get('narration', '').strip()}\n")
-        current_time += float(section.get('duration', 2))
+    durations = [float(section.get('duration', 2)) for section in sections]
+    starts = accumulate(durations, initial=0.0)
+    cues = []
+    for idx, (section, start_time, duration) in enumerate(zip(sections, starts, durations), 1):
+        start = seconds_to_timestamp(start_time)
+        end = seconds_to_timestamp(start_time + duration)
+        heading = section.get('heading', '')
+        narration = section.get('narration', '').strip()
+        cues.append(f"{idx}\n{start} --> {end}\n[{heading}]\n{narration}\n")
+    # Blank line between cues, none after the last one
     with open(srt_path, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(lines))
+        f.write("\n".join(cues))
 
-def download_image_from_unsplash(prompt, output_path):
-    """Download the first Unsplash image for the prompt to output_path."""
-    api_key = os.getenv("UNSPLASH_API_KEY") or os.getenv("UNSPLASH_ACCESS_KEY")
-    if not api_key:
-        raise RuntimeError("UNSPLASH_API_KEY or UNSPLASH_ACCESS_KEY not set in environment.")
-    headers = {"Authorization": f"Client-ID {api_key}"}
-    params = {"query": prompt, "per_page": 1, "orientation": "landscape"}
-    resp = requests.get("https://api.unsplash.com/search/photos", params=params, headers=headers)
+def _new_session():
+    """
+    Create a pooled HTTP client for keep-alive connection reuse.
+    Uses an HTTP/2 httpx.Client when httpx[http2] is installed, so concurrent requests to one host
+    are multiplexed over a single connection; otherwise a requests.Session with a retrying adapter.
+    Either way, failed connection attempts are retried up to 3 times.
+    """
+    if httpx is not None:
+        limits = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        transport = httpx.HTTPTransport(retries=3, http2=True, limits=limits)
+        return httpx.Client(transport=transport, timeout=30.0, follow_redirects=True)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=Retry(total=3, backoff_factor=0.3))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_http_session():
+    """Return the process-wide HTTP client so downloads share keep-alive connections."""
+    global _http_session
+    if _http_session is None:
+        _http_session = _new_session()
+    return _http_session
+
+def _get_unsplash_session():
+    """Return an HTTP client preconfigured with the Unsplash Client-ID header."""
+    global _unsplash_session
+    if _unsplash_session is None:
+        api_key = os.getenv("UNSPLASH_API_KEY") or os.getenv("UNSPLASH_ACCESS_KEY")
+        if not api_key:
+            raise RuntimeError("UNSPLASH_API_KEY or UNSPLASH_ACCESS_KEY not set in environment.")
+        session = _new_session()
+        session.headers["Authorization"] = f"Client-ID {api_key}"
+        _unsplash_session = session
+    return _unsplash_session
+
+def search_unsplash_image_urls(prompt, per_page=1):
+    """Return up to per_page Unsplash image URLs for the prompt, best match first."""
+    params = {"query": prompt, "per_page": per_page, "orientation": "landscape"}
+    resp = _get_unsplash_session().get("https://api.unsplash.com/search/photos", params=params, timeout=30)
     resp.raise_for_status()
     data = resp.json()
-    if data["results"]:
-        img_url = data["results"][0]["urls"]["regular"]
-        img_data = requests.get(img_url).content
-        with open(output_path, "wb") as f:
-            f.write(img_data)
-    else:
+    if not data["results"]:
         raise RuntimeError(f"No Unsplash image found for prompt: {prompt}")
+    return [result["urls"]["regular"] for result in data["results"]]
 
-def get_image_url_from_ai(prompt, model_name=None):
+def search_unsplash_image_url(prompt):
+    """Return the URL of the first Unsplash search result for the prompt."""
+    return search_unsplash_image_urls(prompt)[0]
+
+def download_image_from_unsplash(prompt, output_path):
+    """Download the first Unsplash image for the prompt to output_path."""
+    download_image_from_url(search_unsplash_image_url(prompt), output_path)
+
+def download_images_batch(jobs, max_workers=8):
     """
-    Use Gemini to find a relevant image URL for the given prompt.
-    Returns a direct image URL (jpg/png/etc) or raises if not found.
+    Download (url, output_path) jobs concurrently.
+    Returns a list of (output_path, error) in job order; error is None on success.
     """
-    from google.generativeai.client import configure
-    from google.generativeai.generative_models import GenerativeModel
-    import os
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise RuntimeError("GEMINI_API_KEY not found in environment.")
-    configure(api_key=api_key)
+    def _download(job):
+        url, output_path = job
+        try:
+            download_image_from_url(url, output_path)
+            return output_path, None
+        except Exception as e:
+            return output_path, e
+    if not jobs:
+        return []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_download, jobs))
+
+def configure_gemini(api_key=None):
+    """Configure the Gemini client once per process (api_key defaults to GEMINI_API_KEY)."""
+    global _gemini_configured
+    with _gemini_lock:
+        if _gemini_configured:
+            return
+        from google.generativeai.client import configure
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY not found in environment.")
+        configure(api_key=api_key)
+        _gemini_configured = True
+
+def get_gemini_model(model_name, api_key=None):
+    """Return a memoized GenerativeModel, configuring the Gemini client on first use."""
+    configure_gemini(api_key)
+    with _gemini_lock:
+        model = _gemini_models.get(model_name)
+        if model is None:
+            from google.generativeai.generative_models import GenerativeModel
+            model = _gemini_models[model_name] = GenerativeModel(model_name)
+        return model
+
+def _image_url_request(prompt, model_name=None):
+    """Return (model_name, ai_prompt) for the AI image URL lookup of prompt."""
     model_name = model_name or "models/gemini-1.5-flash"
-    model = GenerativeModel(model_name)
     # Prompt Gemini to return a direct image URL only
     ai_prompt = (
         f"Find a single, high-quality, copyright-free image for this topic: '{prompt}'. "
         "Return ONLY the direct image URL (ending in .jpg, .jpeg, .png, or .webp). "
         "Do not include any explanation, markdown, or text."
     )
-    response = model.generate_content(ai_prompt)
+    return model_name, ai_prompt
+
+def get_image_url_from_ai(prompt, model_name=None):
+    """
+    Use Gemini to find a relevant image URL for the given prompt.
+    Returns a direct image URL (jpg/png/etc) or raises if not found.
+    A fresh URL is not cached until remember_image_url() confirms it downloaded.
+    """
+    model_name, ai_prompt = _image_url_request(prompt, model_name)
+    cached_url = llm_cache.check_cache(llm_cache.make_key(model_name, ai_prompt))
+    if cached_url:
+        return cached_url
+    response = get_gemini_model(model_name).generate_content(ai_prompt)
     url = response.text.strip().split()[0]
     # Basic validation
-    if not (url.startswith("http") and any(url.lower().endswith(ext) for ext in [".jpg", ".jpeg", ".png", ".webp"])):
+    if not (url.startswith("http") and url.lower().endswith(_IMG_EXTS)):
         raise RuntimeError(f"AI did not return a valid image URL: {url}")
     return url
 
+def remember_image_url(prompt, url, model_name=None):
+    """Cache url as the AI image URL for prompt, once it has been downloaded successfully."""
+    model_name, ai_prompt = _image_url_request(prompt, model_name)
+    llm_cache.save_to_cache(llm_cache.make_key(model_name, ai_prompt), url, model=model_name)
+
+def fit_image_to_frame(image_path, size):
+    """
+    Resize the image in place to exactly size (width, height): scaled to fit, centered on black.
+    Written via a temp file and os.replace, since cached downloads are hard-linked into the output dir.
+    """
+    from PIL import Image, ImageOps
+    with Image.open(image_path) as im:
+        if im.size == tuple(size) and im.mode == "RGB":
+            return
+        fitted = ImageOps.contain(im.convert("RGB"), tuple(size), Image.LANCZOS)
+    frame = Image.new("RGB", tuple(size))
+    frame.paste(fitted, ((size[0] - fitted.width) // 2, (size[1] - fitted.height) // 2))
+    tmp_path = f"{image_path}.tmp"
+    frame.save(tmp_path, format=Image.registered_extensions().get(os.path.splitext(str(image_path))[1].lower(), "PNG"))
+    os.replace(tmp_path, image_path)
+
+def _fetch_url_to_file(url, output_path):
+    """Stream the response body for url to output_path in 64 KiB chunks."""
+    if httpx is not None:
+        with get_http_session().stream("GET", url) as resp:
+            resp.raise_for_status()
+            with open(output_path, "wb") as f:
+                for chunk in resp.iter_bytes(1 << 16):
+                    f.write(chunk)
+        return
+    with get_http_session().get(url, timeout=30, stream=True) as resp:
+        resp.raise_for_status()
+        resp.raw.decode_content = True
+        with open(output_path, "wb") as f:
+            shutil.copyfileobj(resp.raw, f, length=1 << 16)
+
 def download_image_from_url(url, output_path):
-    """Download an image from a direct URL to output_path."""
-    import requests
-    resp = requests.get(url, timeout=30)
-    resp.raise_for_status()
-    with open(output_path, "wb") as f:
-        f.write(resp.content) 
\ No newline at end of file
+    """Download an image from a direct URL to output_path, reusing a cached copy from earlier runs if present."""
+    image_cache.get_or_download(url, output_path, _fetch_url_to_file) 
\ No newline at end of file
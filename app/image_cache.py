@@ -0,0 +1,62 @@
+"""
+On-disk content cache for downloaded images, shared across pipeline runs.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+CACHE_ROOT = Path(os.getenv("IMAGE_CACHE_DIR", "outputs/.cache/images"))
+
+def set_cache_dir(cache_dir) -> None:
+    """Keep the cache under cache_dir/images (the pipeline's shared cache dir) unless IMAGE_CACHE_DIR is set."""
+    global CACHE_ROOT
+    if not os.getenv("IMAGE_CACHE_DIR"):
+        CACHE_ROOT = Path(cache_dir) / "images"
+
+def cache_path_for(url: str) -> Path:
+    """Return the cache location for a URL (sha256, sharded by the first two hex digits)."""
+    h = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return CACHE_ROOT / h[:2] / h
+
+def link_or_copy(src: Path, dst: Path) -> None:
+    """Hard-link src to dst, falling back to a copy across filesystems."""
+    dst = Path(dst)
+    if dst.exists():
+        dst.unlink()
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+def new_temp_path(url: str) -> Path:
+    """Reserve a unique temp file next to the cache entry for url, for an atomic os.replace afterwards."""
+    cached = cache_path_for(url)
+    cached.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=cached.parent, suffix=".tmp")
+    os.close(fd)
+    return Path(tmp_name)
+
+def get_or_download(url: str, output_path, fetch: Callable[[str, Path], None]) -> None:
+    """
+    Place the image at url into output_path, downloading it only if it is not cached yet.
+    fetch(url, path) must write the response body to path.
+    """
+    cached = cache_path_for(url)
+    if not cached.exists():
+        tmp_path = new_temp_path(url)
+        try:
+            fetch(url, tmp_path)
+            os.replace(tmp_path, cached)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+    else:
+        logger.info(f"Image cache hit for {url}")
+    link_or_copy(cached, output_path)
@@ -0,0 +1,79 @@
+"""
+Persistent response cache for LLM (Gemini) calls.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Bump when prompt templates change so stale responses are not reused
+PROMPT_VERSION = "v1"
+DEFAULT_TTL = 7 * 86400
+CACHE_PATH = Path(os.getenv("LLM_CACHE_PATH", "outputs/.cache/llm_cache.sqlite3"))
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[Path] = None
+
+def set_cache_dir(cache_dir) -> None:
+    """Keep the cache database in cache_dir (the pipeline's shared cache dir) unless LLM_CACHE_PATH is set."""
+    global CACHE_PATH
+    if not os.getenv("LLM_CACHE_PATH"):
+        CACHE_PATH = Path(cache_dir) / "llm_cache.sqlite3"
+
+def _connection() -> sqlite3.Connection:
+    """Return the shared SQLite connection, opening it on first use. Caller must hold _lock."""
+    global _conn, _conn_path
+    if _conn is None or _conn_path != CACHE_PATH:
+        if _conn is not None:
+            _conn.close()
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(CACHE_PATH), timeout=10, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache("
+            "hash TEXT PRIMARY KEY, prompt_version TEXT, model TEXT, response TEXT, expires_at INTEGER)"
+        )
+        _conn_path = CACHE_PATH
+    return _conn
+
+def make_key(model_name: Optional[str], prompt: str, prompt_version: str = PROMPT_VERSION) -> str:
+    """Build the exact-match cache key for a (prompt, model, prompt version) triple."""
+    return hashlib.sha256(f"{prompt_version}|{model_name}|{prompt}".encode("utf-8")).hexdigest()
+
+def check_cache(key: str) -> Optional[str]:
+    """Return the cached response for key, or None on miss/expiry."""
+    try:
+        with _lock:
+            row = _connection().execute(
+                "SELECT response, expires_at FROM cache WHERE hash = ?", (key,)
+            ).fetchone()
+    except sqlite3.Error as e:
+        logger.warning(f"LLM cache lookup failed: {e}")
+        return None
+    if row is None:
+        return None
+    response, expires_at = row
+    if expires_at < time.time():
+        return None
+    return response
+
+def save_to_cache(key: str, value: str, model: Optional[str] = None, ttl: int = DEFAULT_TTL,
+                  prompt_version: str = PROMPT_VERSION) -> None:
+    """Store a response under key with the given TTL (seconds)."""
+    try:
+        with _lock:
+            conn = _connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache(hash, prompt_version, model, response, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, prompt_version, model, value, int(time.time()) + ttl)
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        logger.warning(f"LLM cache write failed: {e}")
@@ -1,6 +1,10 @@
 import sys
-import json
+from contextlib import contextmanager
+from dataclasses import replace
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
+from app import _json
 from app.config import load_config
 from app.engines import EngineManager
 from app.pipeline import VideoPipeline
@@ -18,6 +22,9 @@ def parse_arguments():
     parser.add_argument('--only_script', action='store_true', help='Run only the script step and validate output')
     parser.add_argument('--only_audio', action='store_true', help='Run only the audio step and validate output')
     parser.add_argument('--only_image', action='store_true', help='Run only the image step and validate output')
+    parser.add_argument('--per-segment', action='store_true', help='Encode one file per section and concatenate them instead of a single ffmpeg pass (debugging)')
+    parser.add_argument('--hw_encoder', help="Hardware H.264 encoder for video assembly: 'auto' to probe for NVENC/QSV/VideoToolbox, or an ffmpeg encoder name (default: libx264)")
+    parser.add_argument('--streaming', action='store_true', help='Overlap voice, image and video encoding per section (full runs only)')
     args = parser.parse_args()
     return args
 
@@ -32,14 +39,13 @@ def validate_arguments(args):
 
 def load_input_data(input_file):
     try:
-        with open(input_file, 'r') as f:
-            data = json.load(f)
+        data = _json.load(input_file)
         required_fields = ['topic']
         for field in required_fields:
             if field not in data:
                 raise ValueError(f"Missing required field: {field}")
         return data
-    except json.JSONDecodeError as e:
+    except _json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in input file: {e}")
     except Exception as e:
         raise RuntimeError(f"Failed to load input file: {e}")
@@ -56,57 +62,79 @@ def handle_existing_data(args, logger):
         'voice': existing_path / "audio" / "voice.json", 
         'images': existing_path / "images" / "images.json"
     }
-    pipeline_data = {}
     for data_type, file_path in data_files.items():
         if not file_path.exists():
             raise FileNotFoundError(f"{data_type} data not found: {file_path}")
-        with open(file_path, 'r') as f:
-            pipeline_data[data_type] = json.load(f)
+    # The three files are independent, so read and parse them concurrently
+    with ThreadPoolExecutor(max_workers=len(data_files)) as executor:
+        pipeline_data = dict(zip(data_files, executor.map(_json.load, data_files.values())))
     pipeline_data['images']['output_dir'] = str(existing_path)
     logger.info(f"Successfully loaded existing data with {len(pipeline_data['images'].get('sections', []))} sections")
     return pipeline_data['images']
 
-def run_pipeline(args, logger):
+def _shared_cache_dir(output_root) -> str:
+    """Cache directory shared by all runs under output_root (next to the LLM and image caches)."""
+    return str(Path(output_root) / ".cache")
+
+@contextmanager
+def _bootstrap(output_dir: str, max_workers: int, cache_dir: str, hw_encoder: Optional[str] = None):
+    """Yield a pipeline for one output directory; its worker pools and the engine sessions are closed on exit."""
     config = load_config()
+    if hw_encoder:
+        config = replace(config, video=replace(config.video, hw_encoder=hw_encoder))
     engine_manager = EngineManager(config)
+    try:
+        with VideoPipeline(config, engine_manager, output_dir, max_workers=max_workers, cache_dir=cache_dir) as pipeline:
+            yield pipeline
+    finally:
+        engine_manager.close()
+
+def run_pipeline(args, logger):
     if args.use_existing:
         existing_data = handle_existing_data(args, logger)
         if existing_data is None:
             raise RuntimeError("Failed to load existing data")
-        pipeline = VideoPipeline(config, engine_manager, existing_data['output_dir'], max_workers=args.max_workers)
-        return pipeline.assemble_video(existing_data)
+        with _bootstrap(existing_data['output_dir'], args.max_workers, _shared_cache_dir(args.output_dir),
+                        hw_encoder=args.hw_encoder) as pipeline:
+            return pipeline.assemble_video(existing_data, per_segment=args.per_segment)
     input_data = load_input_data(args.input)
     logger.info(f"Input configuration loaded: {input_data.get('topic', 'Untitled')}")
     output_dir = create_numbered_directory(args.output_dir, input_data['topic'])
     logger.info(f"Output directory: {output_dir}")
-    pipeline = VideoPipeline(config, engine_manager, str(output_dir), max_workers=args.max_workers)
-    start_step = args.step or 1
-    try:
-        if start_step <= 1:
-            logger.info("--- Step 1: Script Generation ---")
-            script_data = pipeline.generate_script(input_data)
-        else:
-            logger.info(f"Skipping Step 1 - starting from step {start_step}")
-            script_data = pipeline.load_step_data('script')
-        if start_step <= 2:
-            logger.info("--- Step 2: Voice Generation ---")
-            voice_data = pipeline.generate_voice(script_data)
-        else:
-            logger.info(f"Skipping Step 2 - starting from step {start_step}")
-            voice_data = pipeline.load_step_data('voice')
-        if start_step <= 3:
-            logger.info("--- Step 3: Image Generation ---")
-            image_data = pipeline.generate_images(voice_data)
-        else:
-            logger.info(f"Skipping Step 3 - starting from step {start_step}")
-            image_data = pipeline.load_step_data('images')
-        logger.info("--- Step 4: Video Assembly ---")
-        final_video_path = pipeline.assemble_video(image_data)
-        logger.info(f"✅ Pipeline complete! Final video: {final_video_path}")
-        return final_video_path
-    except Exception as e:
-        logger.error(f"Pipeline failed: {e}")
-        raise
+    with _bootstrap(str(output_dir), args.max_workers, _shared_cache_dir(args.output_dir),
+                    hw_encoder=args.hw_encoder) as pipeline:
+        start_step = args.step or 1
+        if getattr(args, 'streaming', False) and start_step == 1:
+            logger.info("--- Streaming pipeline: script, then per-section voice/image/video ---")
+            final_video_path = pipeline.run_streaming(input_data)
+            logger.info(f"✅ Pipeline complete! Final video: {final_video_path}")
+            return final_video_path
+        try:
+            if start_step <= 1:
+                logger.info("--- Step 1: Script Generation ---")
+                script_data = pipeline.generate_script(input_data)
+            else:
+                logger.info(f"Skipping Step 1 - starting from step {start_step}")
+                script_data = pipeline.load_step_data('script')
+            if start_step <= 2:
+                logger.info("--- Step 2: Voice Generation ---")
+                voice_data = pipeline.generate_voice(script_data)
+            else:
+                logger.info(f"Skipping Step 2 - starting from step {start_step}")
+                voice_data = pipeline.load_step_data('voice')
+            if start_step <= 3:
+                logger.info("--- Step 3: Image Generation ---")
+                image_data = pipeline.generate_images(voice_data)
+            else:
+                logger.info(f"Skipping Step 3 - starting from step {start_step}")
+                image_data = pipeline.load_step_data('images')
+            logger.info("--- Step 4: Video Assembly ---")
+            final_video_path = pipeline.assemble_video(image_data, per_segment=args.per_segment)
+            logger.info(f"✅ Pipeline complete! Final video: {final_video_path}")
+            return final_video_path
+        except Exception as e:
+            logger.error(f"Pipeline failed: {e}")
+            raise
 
 def main():
     logger = setup_logging()
@@ -114,39 +142,29 @@ def main():
         args = parse_arguments()
         validate_arguments(args)
         if getattr(args, 'only_script', False):
-            config = load_config()
-            engine_manager = EngineManager(config)
             input_data = load_input_data(args.input)
             output_dir = create_numbered_directory(args.output_dir, input_data['topic'])
-            pipeline = VideoPipeline(config, engine_manager, str(output_dir), max_workers=args.max_workers)
-            logger.info("--- Step 1: Script Generation (Test Mode) ---")
-            script_data = pipeline.generate_script(input_data)
-            print(json.dumps(script_data, indent=2, ensure_ascii=False))
-            print("\n✅ Script step complete and validated.")
-            return 0
+            with _bootstrap(str(output_dir), args.max_workers, _shared_cache_dir(args.output_dir)) as pipeline:
+                logger.info("--- Step 1: Script Generation (Test Mode) ---")
+                script_data = pipeline.generate_script(input_data)
+                print(_json.dumps(script_data, indent=True).decode('utf-8'))
+                print("\n✅ Script step complete and validated.")
+                return 0
         if getattr(args, 'only_audio', False):
-            config = load_config()
-            engine_manager = EngineManager(config)
             # Find the latest script.json in the output_dir
-            from glob import glob
-            import os
             scripts_dir = Path(args.output_dir) / 'scripts'
             script_path = scripts_dir / 'script.json'
             if not script_path.exists():
                 raise FileNotFoundError(f"script.json not found in {scripts_dir}")
-            with open(script_path, 'r') as f:
-                script_data = json.load(f)
-            pipeline = VideoPipeline(config, engine_manager, str(Path(args.output_dir)), max_workers=args.max_workers)
-            logger.info("--- Step 2: Voice Generation (Test Mode) ---")
-            manifest = pipeline.generate_voice(script_data, test_mode=True)
-            print(json.dumps(manifest, indent=2, ensure_ascii=False))
-            print("\n✅ Audio step complete and validated.")
-            return 0
+            script_data = _json.load(script_path)
+            with _bootstrap(str(Path(args.output_dir)), args.max_workers, _shared_cache_dir(Path(args.output_dir).parent)) as pipeline:
+                logger.info("--- Step 2: Voice Generation (Test Mode) ---")
+                manifest = pipeline.generate_voice(script_data, test_mode=True)
+                print(_json.dumps(manifest, indent=True).decode('utf-8'))
+                print("\n✅ Audio step complete and validated.")
+                return 0
         if getattr(args, 'only_image', False):
-            config = load_config()
-            engine_manager = EngineManager(config)
             # Find the latest voice.json and script.json in the output_dir
-            import os
             scripts_dir = Path(args.output_dir) / 'scripts'
             audio_dir = Path(args.output_dir) / 'audio'
             script_path = scripts_dir / 'script.json'
@@ -155,20 +173,21 @@ def main():
                 raise FileNotFoundError(f"script.json not found in {scripts_dir}")
             if not voice_path.exists():
                 raise FileNotFoundError(f"voice.json not found in {audio_dir}")
-            with open(script_path, 'r') as f:
-                script_data = json.load(f)
-            with open(voice_path, 'r') as f:
-                voice_data = json.load(f)
+            script_data = _json.load(script_path)
+            voice_data = _json.load(voice_path)
             # For compatibility, reconstruct voice_data as a dict with meta and sections from script
             if isinstance(voice_data, list):
                 # Use script_data for meta/sections, as in the main pipeline
                 voice_data = script_data
-            pipeline = VideoPipeline(config, engine_manager, str(Path(args.output_dir)), max_workers=args.max_workers)
-            logger.info("--- Step 3: Image Generation (Test Mode) ---")
-            manifest = pipeline.generate_images(voice_data, test_mode=True)
-            print(json.dumps(manifest, indent=2, ensure_ascii=False))
-            print("\n✅ Image step complete and validated.")
-            return 0
+            with _bootstrap(str(Path(args.output_dir)), args.max_workers, _shared_cache_dir(Path(args.output_dir).parent)) as pipeline:
+                logger.info("--- Step 3: Image Generation (Test Mode) ---")
+                existing = pipeline.find_existing_images(voice_data['sections'])
+                if existing:
+                    logger.info(f"Reusing {len(existing)} existing image(s) from {pipeline.images_dir}")
+                manifest = pipeline.generate_images(voice_data, test_mode=True, skip_sections=existing)
+                print(_json.dumps(manifest, indent=True).decode('utf-8'))
+                print("\n✅ Image step complete and validated.")
+                return 0
         final_video_path = run_pipeline(args, logger)
         print(f"\n🎉 Video production complete!")
         print(f"📁 Output: {final_video_path}")
@@ -1,71 +1,261 @@
 # ... update imports to use relative imports if needed ... 
 
 import json
+import os
 import re
+import shutil
+import subprocess
 import logging
 from datetime import datetime
+from functools import cached_property, lru_cache
 from pathlib import Path
-from typing import Dict, Any, List, Optional
-from tqdm import tqdm
+from typing import Dict, Any, Callable, List, Optional
 import ffmpeg
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import threading
 import app.helpers as helpers
+from app import _json, async_io, image_cache, llm_cache
 from app.config import PipelineConfig, TTSConfig, ImageConfig, VideoConfig
 from app.engines import EngineManager
-from app.utils import save_json, load_json, ensure_directory, clean_temp_files, validate_file_exists, sanitize_filename
-import jsonschema
+from app.utils import (save_json, load_json, ensure_directory, clean_temp_files, validate_file_exists, sanitize_filename,
+                       content_cache_path, prune_content_cache)
+from app.image_cache import link_or_copy
 from app.image_model_defaults import IMAGE_MODEL_DEFAULTS
 
 logger = logging.getLogger(__name__)
 
 def validate_script_sections(sections):
     """Validate that sections is a list of dicts with non-empty heading and narration."""
-    if not isinstance(sections, list) or not sections:
-        return False
-    for section in sections:
-        if not isinstance(section, dict):
-            return False
-        if not section.get("heading") or not section.get("narration"):
-            return False
-    return True
+    return (isinstance(sections, list) and bool(sections)
+            and all(isinstance(s, dict) and s.get("heading") and s.get("narration") for s in sections))
+
+_IMAGE_SUFFIXES = {'.png', '.jpg', '.jpeg', '.webp'}
+# Upper bounds for worker pools; x264 throughput plateaus well before this many concurrent encodes
+_MAX_WORKERS = 16
+_MAX_ENCODE_WORKERS = 8
+# The single-pass render opens two inputs per section; beyond this, ffmpeg hits open-file and graph size limits
+_MAX_SINGLE_PASS_SECTIONS = 500
+# Section completions are appended to progress.log.jsonl; progress.json is compacted from it at stage
+# boundaries or after this many events
+_PROGRESS_COMPACT_EVERY = 256
+
+# Hardware H.264 encoders in probe order, with their low-latency output options
+_HW_ENCODER_OPTIONS = {
+    'h264_nvenc': {'preset': 'p1', 'tune': 'll', 'rc': 'vbr', 'cq': 23},
+    'h264_qsv': {'preset': 'veryfast', 'global_quality': 23},
+    'h264_videotoolbox': {'b:v': '4M'},  # no constant-quality mode on every macOS release; default bitrate is very low
+}
+
+@lru_cache(maxsize=1)
+def detect_hw_encoder() -> Optional[str]:
+    """Return the first hardware H.264 encoder that ffmpeg lists and can actually open on this machine, or None."""
+    try:
+        listing = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                                 capture_output=True, text=True, timeout=10).stdout
+        for encoder in _HW_ENCODER_OPTIONS:
+            if encoder not in listing:
+                continue
+            # Builds often list encoders whose device is missing, so confirm with a tiny test encode
+            probe = subprocess.run(['ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi',
+                                    '-i', 'color=c=black:s=256x256:d=0.1', '-c:v', encoder, '-f', 'null', '-'],
+                                   capture_output=True, timeout=20)
+            if probe.returncode == 0:
+                return encoder
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.info(f"Hardware encoder probe failed: {e}")
+    return None
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_FENCE_RE = re.compile(r'```json\s*(?=\[)')
+
+def _decode_sections_array(text: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Find the list of section objects in a model response: the ```json fenced block if there is one,
+    else the first '[' at which a JSON array of objects decodes (so 'Here are [3] sections' is skipped).
+    """
+    fence = _JSON_FENCE_RE.search(text)
+    starts = [fence.end()] if fence else []
+    start = text.find('[')
+    while start != -1:
+        starts.append(start)
+        start = text.find('[', start + 1)
+    for start in starts:
+        try:
+            value, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            return value
+    return None
+_SCRIPT_SCHEMA_PATH = Path(__file__).parent.parent / "schemas" / "script.schema.json"
+
+@lru_cache(maxsize=1)
+def _script_validator():
+    """Load and check the script.json schema once; the validator is reused for every generated script."""
+    import jsonschema
+    schema = _json.load(_SCRIPT_SCHEMA_PATH)
+    jsonschema.Draft7Validator.check_schema(schema)
+    return jsonschema.Draft7Validator(schema)
+
+def _progress_bar(iterable, **kwargs):
+    """
+    Wrap iterable in a tqdm bar; tqdm is imported on first use rather than at start-up.
+    Redraws are throttled, since parallel futures often finish in bursts.
+    """
+    from tqdm import tqdm
+    kwargs.setdefault('mininterval', 0.5)
+    kwargs.setdefault('smoothing', 0.1)
+    kwargs.setdefault('dynamic_ncols', True)
+    return tqdm(iterable, **kwargs)
+
+def _fallback_section(heading: str, narration_lines: List[str]) -> Dict[str, str]:
+    # Each narration line keeps its trailing space, as the original line-by-line parser produced
+    return {"heading": heading, "narration": " ".join(narration_lines) + " " if narration_lines else ""}
 
 class VideoPipeline:
     """Main video production pipeline with progress tracking, resumption, and parallel processing."""
     
-    def __init__(self, config: PipelineConfig, engine_manager: EngineManager, output_dir: str, max_workers: int = 4):
+    def __init__(self, config: PipelineConfig, engine_manager: EngineManager, output_dir: str, max_workers: int = 4,
+                 cache_dir: Optional[str] = None):
+        """cache_dir holds state shared across runs (e.g. outputs/.cache); defaults to output_dir/.cache."""
         self.config = config
         self.engine_manager = engine_manager
         self.output_dir = Path(output_dir)
-        self.max_workers = max_workers
+        # max_workers sizes network-bound work (API calls, downloads), so it is not limited by the CPU count
+        self.max_workers = max(1, min(max_workers, _MAX_WORKERS))
+        if self.max_workers != max_workers:
+            logger.warning(f"max_workers={max_workers} clamped to {self.max_workers}")
         self.scripts_dir = ensure_directory(self.output_dir / "scripts")
         self.audio_dir = ensure_directory(self.output_dir / "audio")
         self.images_dir = ensure_directory(self.output_dir / "images")
         self.video_dir = ensure_directory(self.output_dir / "video")
+        self.cache_dir = Path(cache_dir) if cache_dir else self.output_dir / ".cache"
+        self._shared_cache = cache_dir is not None
+        if self._shared_cache:
+            # The LLM and downloaded-image caches follow --output_dir instead of the working directory
+            llm_cache.set_cache_dir(self.cache_dir)
+            image_cache.set_cache_dir(self.cache_dir)
+        # Content-addressed TTS/image outputs, keyed by input text + engine config
+        self.content_cache_dir = self.cache_dir / "content"
         self.progress_path = self.output_dir / "progress.json"
-        self.progress = self._load_progress()
+        self.progress_log_path = self.output_dir / "progress.log.jsonl"
         self._progress_lock = threading.Lock()
+        self._flush_lock = threading.RLock()  # serializes progress.json writes; _save_progress also runs under _maybe_flush_progress
+        self._progress_log = None
+        self._progress_dirty = 0
+        self.progress = self._load_progress()
+        if self.progress_log_path.exists():
+            self._save_progress()
+        # Remote TTS/image calls are latency bound and get a wide pool; ffmpeg encodes are CPU bound.
+        # The I/O pool is sized from the requested max_workers: threads blocked on sockets don't need a core each.
+        self._io_workers = config.io_workers if config.io_workers > 0 else self.max_workers
+        self._cpu_workers = min(config.cpu_workers if config.cpu_workers > 0 else (os.cpu_count() or 1), _MAX_ENCODE_WORKERS)
+        self._io_pool = ThreadPoolExecutor(max_workers=self._io_workers, thread_name_prefix="avp-io")
+        self._cpu_pool = ThreadPoolExecutor(max_workers=self._cpu_workers, thread_name_prefix="avp-cpu")
+
+    def close(self):
+        """Shut down the worker pools, compact the progress log into progress.json and close it."""
+        self._io_pool.shutdown(wait=True)
+        self._cpu_pool.shutdown(wait=True)
+        self._maybe_flush_progress(force=True)
+        if self._progress_log is not None:
+            self._progress_log.close()
+            self._progress_log = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
     def _load_progress(self):
+        """
+        Load progress.json: {"script": bool, "video": bool, "sections": {"<idx>": {"voice"|"image"|"segment": "done"}}}
+        and replay section events from progress.log.jsonl that were not compacted into it yet.
+        Files written by older versions (flat "voice"/"images" index lists) are migrated on load.
+        """
+        progress = None
         if self.progress_path.exists():
             try:
-                with open(self.progress_path, 'r') as f:
-                    return json.load(f)
+                progress = _json.load(self.progress_path)
             except Exception as e:
                 logger.warning(f"Failed to load progress.json: {e}")
-        return {
-            "script": False,
-            "voice": [],
-            "images": [],
-            "video": False
-        }
+        if not isinstance(progress, dict):
+            progress = {}
+        sections = progress.setdefault("sections", {})
+        for legacy_key, stage in (("voice", "voice"), ("images", "image")):
+            for idx in progress.pop(legacy_key, []):
+                sections.setdefault(str(idx), {})[stage] = "done"
+        if self.progress_log_path.exists():
+            for line in self.progress_log_path.read_bytes().splitlines():
+                try:
+                    event = _json.loads(line)
+                except _json.JSONDecodeError:
+                    continue  # torn last line from an interrupted write
+                sections.setdefault(str(event["idx"]), {})[event["stage"]] = "done"
+        progress.setdefault("script", False)
+        progress.setdefault("video", False)
+        return progress
 
     def _save_progress(self):
+        """
+        Write the full progress.json atomically, then empty the event log it now includes.
+        Only the snapshot is taken under _progress_lock; the file write happens outside it, under _flush_lock.
+        """
+        with self._flush_lock:
+            try:
+                with self._progress_lock:
+                    data = _json.dumps(self.progress, indent=True)
+                    snapshot_events = self._progress_dirty
+                tmp_path = self.progress_path.with_suffix('.json.tmp')
+                tmp_path.write_bytes(data)
+                os.replace(tmp_path, self.progress_path)
+                with self._progress_lock:
+                    if self._progress_dirty == snapshot_events:
+                        if self._progress_log is not None:
+                            self._progress_log.truncate(0)
+                        elif self.progress_log_path.exists():
+                            self.progress_log_path.unlink()
+                        self._progress_dirty = 0
+                    else:
+                        # Events logged meanwhile are not in the snapshot; keep the log (replay is idempotent)
+                        self._progress_dirty -= snapshot_events
+            except Exception as e:
+                logger.warning(f"Failed to save progress.json: {e}")
+
+    def _mark_progress(self, stage: str, idx: int):
+        """Record that a section's stage ("voice", "image" or "segment") is done by appending one event to the progress log."""
+        event = _json.dumps({"idx": idx, "stage": stage}) + b"\n"
+        with self._progress_lock:
+            self.progress["sections"].setdefault(str(idx), {})[stage] = "done"
+            try:
+                if self._progress_log is None:
+                    self._progress_log = open(self.progress_log_path, "ab", buffering=0)
+                self._progress_log.write(event)
+            except OSError as e:
+                logger.warning(f"Failed to append to {self.progress_log_path.name}: {e}")
+            self._progress_dirty += 1
+        self._maybe_flush_progress()
+
+    def _completed(self, stage: str) -> set:
+        """Indices of the sections whose stage is done."""
+        with self._progress_lock:
+            return {int(idx) for idx, state in self.progress["sections"].items() if state.get(stage) == "done"}
+
+    def _maybe_flush_progress(self, force: bool = False):
+        """
+        Compact logged events into progress.json at a stage boundary (force) or once the log grows long.
+        A non-forced call skips the flush if another thread is already writing; that flush or the next one covers it.
+        """
+        with self._progress_lock:
+            if not self._progress_dirty or not (force or self._progress_dirty >= _PROGRESS_COMPACT_EVERY):
+                return
+        if not self._flush_lock.acquire(blocking=force):
+            return
         try:
-            with open(self.progress_path, 'w') as f:
-                json.dump(self.progress, f, indent=2)
-        except Exception as e:
-            logger.warning(f"Failed to save progress.json: {e}")
+            self._save_progress()
+        finally:
+            self._flush_lock.release()
 
     def generate_script(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         if self.progress.get("script"):
@@ -73,14 +263,17 @@ class VideoPipeline:
             return self.load_step_data('script')
         if not self.config.gemini_api_key:
             raise RuntimeError("GEMINI_API_KEY not found in environment")
-        from google.generativeai.client import configure
-        from google.generativeai.generative_models import GenerativeModel
-        configure(api_key=self.config.gemini_api_key)
         model_name = input_data.get("model", self.config.default_model)
         prompt = helpers.build_prompt(input_data)
-        model = GenerativeModel(model_name)
-        response = model.generate_content(prompt)
-        text = response.text
+        cache_key = llm_cache.make_key(model_name, prompt)
+        text = llm_cache.check_cache(cache_key)
+        fresh_response = text is None
+        if fresh_response:
+            helpers.configure_gemini(self.config.gemini_api_key)
+            response = helpers.get_gemini_model(model_name).generate_content(prompt)
+            text = response.text
+        else:
+            logger.info("Using cached script response")
         sections = self._parse_script_response(text)
         # --- Section Consistency ---
         sections = helpers.ensure_section_consistency(sections)
@@ -90,8 +283,9 @@ class VideoPipeline:
         for i, section in enumerate(sections):
             section['style'] = style_cycle[i % len(style_cycle)]
         # ---
-        for section in sections:
-            section["duration"] = helpers.estimate_duration(section["narration"])
+        durations = helpers.estimate_durations([section["narration"] for section in sections])
+        for section, duration in zip(sections, durations):
+            section["duration"] = duration
         title = input_data.get("topic", "Generated Video Script")
         if sections and sections[0].get("heading"):
             title = sections[0]["heading"]
@@ -109,14 +303,15 @@ class VideoPipeline:
             "meta": meta
         }
         # --- JSON Schema Validation ---
-        schema_path = Path(__file__).parent.parent / "schemas" / "script.schema.json"
-        with open(schema_path, "r") as f:
-            schema = json.load(f)
+        import jsonschema
         try:
-            jsonschema.validate(instance=output, schema=schema)
+            _script_validator().validate(output)
         except jsonschema.ValidationError as e:
             logger.error(f"script.json validation failed: {e.message}")
             raise ValueError(f"script.json validation failed: {e.message}")
+        # Only a response that parsed and validated is worth replaying on later runs
+        if fresh_response:
+            llm_cache.save_to_cache(cache_key, text, model=model_name)
         # ---
         script_path = self.scripts_dir / "script.json"
         save_json(output, script_path)
@@ -129,31 +324,29 @@ class VideoPipeline:
         return output
 
     def _parse_script_response(self, text: str) -> List[Dict[str, Any]]:
-        json_match = re.search(r'```json\s*(\[.*?\])\s*```', text, re.DOTALL)
-        if json_match:
-            try:
-                sections = json.loads(json_match.group(1))
-                logger.info("Successfully parsed JSON code block from response")
-                return sections
-            except json.JSONDecodeError as e:
-                logger.warning(f"Failed to parse JSON code block: {e}")
+        sections = _decode_sections_array(text)
+        if sections is not None:
+            logger.info("Successfully parsed JSON array from response")
+            return sections
+        if '[' in text:
+            logger.warning("No JSON array of sections found in response")
         logger.info("Using fallback text parsing logic")
         sections = []
-        lines = text.strip().split("\n")
-        current = {}
-        for line in lines:
+        heading = None
+        narration_lines = []
+        for line in text.strip().split("\n"):
             if not line.strip():
                 continue
             if line.endswith(":"):
-                if current:
-                    sections.append(current)
-                current = {"heading": line[:-1], "narration": ""}
+                if heading is not None:
+                    sections.append(_fallback_section(heading, narration_lines))
+                heading, narration_lines = line[:-1], []
             else:
-                if not current:
-                    current = {"heading": "", "narration": ""}
-                current["narration"] += (line + " ")
-        if current:
-            sections.append(current)
+                if heading is None:
+                    heading = ""
+                narration_lines.append(line)
+        if heading is not None:
+            sections.append(_fallback_section(heading, narration_lines))
         return sections
 
     def generate_voice(self, script_data: Dict[str, Any], test_mode: bool = False) -> Any:
@@ -161,52 +354,46 @@ class VideoPipeline:
         meta = script_data.get("meta", {})
         tts_config = TTSConfig(**meta.get("tts", {}))
         sections = script_data["sections"]
-        completed = set(self.progress.get("voice", []))
+        completed = self._completed("voice")
+        # "NN_Safe_Heading" per section, shared by the audio, transcript and VTT filenames
+        stems = [f"{idx:02d}_{sanitize_filename(section['heading'])}" for idx, section in enumerate(sections, 1)]
         tasks = []
         manifest = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            for idx, section in enumerate(sections, 1):
-                if idx in completed:
-                    logger.info(f"Voice for section {idx} already completed. Skipping.")
-                    continue
-                tasks.append(executor.submit(self._generate_voice_section, idx, section, tts_config))
-            for future in tqdm(as_completed(tasks), total=len(tasks), desc="Generating voice", unit="section"):
+        executor = self._io_pool
+        for idx, section in enumerate(sections, 1):
+            if idx in completed and self._reuse_voice(section, f"{stems[idx - 1]}.wav"):
+                logger.info(f"Voice for section {idx} already completed. Skipping.")
+                continue
+            tasks.append(executor.submit(self._generate_voice_section, idx, section, tts_config))
+        try:
+            for future in _progress_bar(as_completed(tasks), total=len(tasks), desc="Generating voice", unit="section"):
                 result = future.result()
                 if result:
-                    idx = result
-                    with self._progress_lock:
-                        self.progress.setdefault("voice", []).append(idx)
-                        self._save_progress()
-        # Build manifest and generate transcripts
-        for idx, section in enumerate(sections, 1):
-            heading = section["heading"]
+                    self._mark_progress("voice", result)
+        finally:
+            self._maybe_flush_progress(force=True)
+        # Build manifest and transcripts, then write the transcript files on the I/O pool
+        speaker = tts_config.voice or "default"
+        transcripts = []
+        for idx, (section, stem) in enumerate(zip(sections, stems), 1):
             narration = section["narration"]
-            safe_heading = sanitize_filename(heading)
-            filename = f"{idx:02d}_{safe_heading}.wav"
-            transcript_path = self.audio_dir / f"{idx:02d}_{safe_heading}.txt"
-            vtt_path = self.audio_dir / f"{idx:02d}_{safe_heading}.vtt"
-            # Write plain text transcript
-            with open(transcript_path, 'w', encoding='utf-8') as f:
-                f.write(narration.strip())
-            # Write WebVTT transcript (single cue for whole narration)
+            text = narration.strip()
+            # Plain text transcript plus a WebVTT transcript (single cue for whole narration)
             duration = section.get("duration", 0)
             start = "00:00:00.000"
-            mins = int(duration // 60)
-            secs = int(duration % 60)
-            ms = int((duration - int(duration)) * 1000)
-            end = f"00:{mins:02}:{secs:02}.{ms:03}"
-            with open(vtt_path, 'w', encoding='utf-8') as f:
-                f.write("WEBVTT\n\n")
-                f.write(f"{start} --> {end}\n{narration.strip()}\n")
+            end = helpers.seconds_to_timestamp(duration, ".")
+            transcripts.append((self.audio_dir / f"{stem}.txt", text))
+            transcripts.append((self.audio_dir / f"{stem}.vtt", f"WEBVTT\n\n{start} --> {end}\n{text}\n"))
             manifest.append({
                 "section_index": idx,
-                "script_heading": heading,
-                "filename": filename,
+                "script_heading": section["heading"],
+                "filename": f"{stem}.wav",
                 "duration": duration,
-                "speaker": tts_config.voice or "default",
+                "speaker": speaker,
                 "text": narration,
                 "format": "wav"
             })
+        list(executor.map(lambda item: item[0].write_text(item[1], encoding='utf-8'), transcripts))
         voice_path = self.audio_dir / "voice.json"
         save_json(manifest, voice_path)
         logger.info(f"Voice generated and saved to {voice_path} (manifest)")
@@ -214,6 +401,20 @@ class VideoPipeline:
             return manifest
         return script_data
 
+    def _reuse_voice(self, section, filename) -> bool:
+        """Point the section at audio from an earlier run if the file is still there."""
+        if not (self.audio_dir / filename).exists():
+            return False
+        section["sound_file"] = filename
+        return True
+
+    def _reuse_image(self, section, filename) -> bool:
+        """Point the section at an image from an earlier run if the file is still there."""
+        if not (self.images_dir / filename).exists():
+            return False
+        section["image_file"] = filename
+        return True
+
     def _generate_voice_section(self, idx, section, tts_config):
         heading = section["heading"]
         narration = section["narration"]
@@ -221,7 +422,9 @@ class VideoPipeline:
         filename = f"{idx:02d}_{safe_heading}.wav"
         output_path = self.audio_dir / filename
         try:
-            self.engine_manager.generate_tts(narration, output_path, tts_config)
+            self._cached_output("audio", f"{narration}\0{tts_config!r}", output_path,
+                                lambda: self.engine_manager.generate_tts(narration, output_path, tts_config)
+                                == tts_config.engine.lower())
             section["sound_file"] = filename
             logger.info(f"[Voice] Section {idx} complete.")
             return idx
@@ -229,8 +432,59 @@ class VideoPipeline:
             logger.error(f"Voice generation failed for section {idx}: {e}")
             return None
 
-    def generate_images(self, voice_data: Dict[str, Any], test_mode: bool = False) -> Any:
-        """Generate images for each section. First, generate and save images.json manifest, then generate images from it."""
+    def _cached_output(self, kind: str, key: str, output_path: Path, generate: Callable[[], bool]) -> None:
+        """
+        Create output_path with generate(), or link it from the content cache if the same key was generated before.
+        generate() returns whether its output may be cached: fallback-engine output must not be stored
+        under the configured engine's key.
+        """
+        cache_path = content_cache_path(self.content_cache_dir, kind, key, output_path.suffix)
+        if cache_path.exists():
+            link_or_copy(cache_path, output_path)
+            os.utime(cache_path)  # keep entries that are still in use from expiring
+            logger.info(f"Content cache hit for {output_path.name}")
+            return
+        # Engines truncate and rewrite an existing file; a fresh inode keeps that from overwriting the cache
+        # entry (or dedupe followers) still hard-linked to the previous output
+        output_path.unlink(missing_ok=True)
+        if not generate():
+            return
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            link_or_copy(output_path, cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to cache {output_path.name}: {e}")
+
+    def _clean_temp_dir(self, temp_dir: Path) -> None:
+        """Remove temp_dir and trim the shared content and image caches to their age and size limits."""
+        # A per-run cache goes away with its run; only the shared ones can grow without bound
+        clean_temp_files(temp_dir, cache_dir=self.content_cache_dir if self._shared_cache else None,
+                         cache_max_bytes=self.config.content_cache_max_mb * 1024 * 1024)
+        if self._shared_cache:
+            prune_content_cache(image_cache.CACHE_ROOT, 30, self.config.image_cache_max_mb * 1024 * 1024)
+
+    def find_existing_images(self, sections: List[Dict[str, Any]]) -> Dict[int, str]:
+        """
+        Map section index -> filename for images already present in images_dir (e.g. from an earlier run).
+        A file only counts for a section if its stem is that section's "{idx:02d}_{heading}" name, so images
+        left over from a script with different headings are not reused.
+        """
+        stems = {f"{idx:02d}_{sanitize_filename(section.get('heading', f'Section {idx}'))}": idx
+                 for idx, section in enumerate(sections, 1)}
+        existing = {}
+        for path in self.images_dir.iterdir():
+            idx = stems.get(path.stem)
+            if idx is not None and path.suffix.lower() in _IMAGE_SUFFIXES and path.is_file():
+                existing[idx] = path.name
+        return existing
+
+    def generate_images(self, voice_data: Dict[str, Any], test_mode: bool = False,
+                        skip_sections: Optional[Dict[int, str]] = None) -> Any:
+        """
+        Generate images for each section. First, generate and save images.json manifest, then generate images from it.
+        skip_sections maps section index -> existing image filename; those sections reuse the file instead of being generated.
+        """
+        skip_sections = skip_sections or {}
         meta = voice_data.get('meta', {})
         image_meta = meta.get('image', {})
         # Defaults for dynamic config
@@ -243,13 +497,16 @@ class VideoPipeline:
         topic = meta.get('topic', '')
         keywords = meta.get('keywords', [])
         sections = voice_data["sections"]
-        completed = set(self.progress.get("images", []))
+        completed = self._completed("image")
         manifest = []
         # --- Phase 1: Build and save manifest ---
         for idx, section in enumerate(sections, 1):
             heading = section.get('heading', f'Section {idx}')
-            safe_heading = sanitize_filename(heading)
-            filename = f"{idx:02d}_{safe_heading}.png"
+            if idx in skip_sections:
+                filename = skip_sections[idx]
+                section['image_file'] = filename
+            else:
+                filename = f"{idx:02d}_{sanitize_filename(heading)}.png"
             prompt = helpers.create_prompt_from_section(section, topic, keywords)
             narration = section.get('narration', '')
             alt_text = f"{heading}: {narration[:80]}" if narration else heading
@@ -277,37 +534,64 @@ class VideoPipeline:
         logger.info(f"Image manifest generated and saved to {images_path}")
         if test_mode:
             return manifest
-        # --- Phase 2: Generate images from manifest ---
-        tasks = []
-        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            for entry in manifest:
-                idx = entry["section_index"]
-                if idx in completed:
-                    logger.info(f"Image for section {idx} already completed. Skipping.")
-                    continue
-                section = sections[idx - 1]
-                image_config = ImageConfig(
-                    engine='stable_diffusion',
-                    model=entry["model"],
-                    size=size,
-                    quality=quality,
-                    fallback_engine='unsplash'
-                )
-                tasks.append(executor.submit(
-                    self._generate_image_section,
-                    idx,
-                    section,
-                    image_config,
-                    topic,
-                    keywords
-                ))
-            for future in tqdm(as_completed(tasks), total=len(tasks), desc="Generating images", unit="section"):
+        # --- Phase 2: Generate images from manifest, once per distinct (prompt, model); prompts differing only
+        # in whitespace count as the same ---
+        groups: Dict[tuple, List[int]] = {}
+        for entry in manifest:
+            idx = entry["section_index"]
+            if idx in skip_sections or (idx in completed and self._reuse_image(sections[idx - 1], entry["filename"])):
+                logger.info(f"Image for section {idx} already completed. Skipping.")
+                continue
+            groups.setdefault((" ".join(entry["prompt"].split()), entry["model"]), []).append(idx)
+        tasks = {}
+        failed = []
+        executor = self._io_pool
+        for (_, model), indices in groups.items():
+            leader = indices[0]
+            image_config = ImageConfig(
+                engine='stable_diffusion',
+                model=model,
+                size=size,
+                quality=quality,
+                fallback_engine='unsplash'
+            )
+            future = executor.submit(
+                self._generate_image_section,
+                leader,
+                sections[leader - 1],
+                image_config,
+                topic,
+                keywords
+            )
+            tasks[future] = indices
+        try:
+            for future in _progress_bar(as_completed(tasks), total=len(tasks), desc="Generating images", unit="image"):
+                indices = tasks[future]
                 result = future.result()
-                if result:
-                    idx = result
-                    with self._progress_lock:
-                        self.progress.setdefault("images", []).append(idx)
-                        self._save_progress()
+                if not result:
+                    failed.extend(indices)
+                    continue
+                self._mark_progress("image", result)
+                # Sections with the same prompt get a copy of the leader's image, not a hard link: the leader is
+                # linked into the content cache, and a follower rewritten later must not change either
+                leader_path = self.images_dir / sections[result - 1]['image_file']
+                for idx in indices[1:]:
+                    filename = manifest[idx - 1]["filename"]
+                    try:
+                        (self.images_dir / filename).unlink(missing_ok=True)
+                        shutil.copyfile(leader_path, self.images_dir / filename)
+                    except OSError as e:
+                        logger.error(f"Could not share image with section {idx}: {e}")
+                        failed.append(idx)
+                        continue
+                    sections[idx - 1]['image_file'] = filename
+                    self._mark_progress("image", idx)
+            # --- Phase 3: AI-powered image URL fallback for failed sections ---
+            if failed:
+                for idx in self._download_fallback_images(sorted(failed), sections, topic, keywords):
+                    self._mark_progress("image", idx)
+        finally:
+            self._maybe_flush_progress(force=True)
         logger.info(f"Images generated and saved to {images_path} (manifest)")
         return voice_data
 
@@ -317,88 +601,349 @@ class VideoPipeline:
         safe_heading = sanitize_filename(heading)
         image_filename = f"{idx:02d}_{safe_heading}.png"
         image_path = self.images_dir / image_filename
+        resolution = self.config.video.resolution
+
+        def generate():
+            engine = self.engine_manager.generate_image(prompt, image_path, image_config)
+            helpers.fit_image_to_frame(image_path, resolution)
+            return engine == image_config.engine.lower()
+
         try:
-            self.engine_manager.generate_image(prompt, image_path, image_config)
+            self._cached_output("images", f"{prompt}\0{image_config!r}\0{resolution}", image_path, generate)
             section['image_file'] = image_filename
             logger.info(f"[Image] Section {idx} complete.")
             return idx
         except Exception as e:
             logger.error(f"Image generation failed for section {idx}: {e}")
-            # AI-powered image URL fallback
+            return None
+
+    def _download_fallback_images(self, indices, sections, topic, keywords):
+        """AI-powered image URL fallback: resolve one URL per failed section, then download them as a single batch."""
+        # Always use the model from pipeline config or root meta
+        model_name = getattr(self.config, 'default_model', None)
+
+        def resolve(idx):
+            prompt = helpers.create_prompt_from_section(sections[idx - 1], topic, keywords)
             try:
-                # Always use the model from pipeline config or root meta
-                model_name = getattr(self.config, 'default_model', None)
-                url = helpers.get_image_url_from_ai(prompt, model_name)
-                helpers.download_image_from_url(url, image_path)
-                section['image_file'] = image_filename
-                logger.info(f"[Image] Section {idx} fallback: AI image URL downloaded.")
+                return idx, prompt, helpers.get_image_url_from_ai(prompt, model_name)
+            except Exception as e:
+                logger.error(f"AI image URL fallback also failed for section {idx}: {e}")
+                return idx, prompt, None
+
+        # A single index is resolved inline: this may already be running on the I/O pool (streaming mode)
+        resolutions = map(resolve, indices) if len(indices) == 1 else self._io_pool.map(resolve, indices)
+        resolved = [(idx, prompt, url) for idx, prompt, url in resolutions if url]
+        jobs = []
+        for idx, _, url in resolved:
+            heading = sections[idx - 1].get('heading', f'Section {idx}')
+            jobs.append((url, self.images_dir / f"{idx:02d}_{sanitize_filename(heading)}.png"))
+        completed = []
+        for (idx, prompt, url), (image_path, error) in zip(resolved, async_io.run_image_jobs(jobs, max_workers=self.max_workers)):
+            if error:
+                logger.error(f"AI image URL fallback also failed for section {idx}: {error}")
+                continue
+            try:
+                helpers.fit_image_to_frame(image_path, self.config.video.resolution)
+            except Exception as e:
+                logger.error(f"AI image URL fallback returned an unreadable image for section {idx}: {e}")
+                continue
+            # Only a URL that yielded a usable image is worth reusing
+            helpers.remember_image_url(prompt, url, model_name)
+            sections[idx - 1]['image_file'] = image_path.name
+            logger.info(f"[Image] Section {idx} fallback: AI image URL downloaded.")
+            completed.append(idx)
+        return completed
+
+    def run_streaming(self, input_data: Dict[str, Any]) -> str:
+        """
+        Run the whole pipeline with per-section overlap instead of strict phases: after the script is
+        generated, each section's voice and image run concurrently on the I/O pool, and its video segment
+        starts encoding on the CPU pool as soon as both are ready. Segments are concatenated once all sections
+        are encoded. Per-section progress lets an interrupted run redo only the missing voice/image/segment work.
+        """
+        script_data = self.generate_script(input_data)
+        meta = script_data.get('meta', {})
+        image_meta = meta.get('image', {})
+        topic = meta.get('topic', '')
+        keywords = meta.get('keywords', [])
+        sections = script_data['sections']
+        tts_config = TTSConfig(**meta.get('tts', {}))
+        # Writes images.json and resolves the per-section model without generating anything
+        image_manifest = self.generate_images(script_data, test_mode=True)
+        temp_dir = ensure_directory(self.video_dir / self.config.temp_dir_name)
+        voice_done = self._completed("voice")
+        image_done = self._completed("image")
+        segment_done = self._completed("segment")
+
+        def image_task(idx, section, image_config):
+            if self._generate_image_section(idx, section, image_config, topic, keywords):
                 return idx
-            except Exception as e2:
-                logger.error(f"AI image URL fallback also failed for section {idx}: {e2}")
-                return None
+            return idx if self._download_fallback_images([idx], sections, topic, keywords) else None
+
+        segment_tasks = {}
+        finished = []
+
+        def queue_segment(idx):
+            segment_path = temp_dir / f"segment_{idx:02d}.mp4"
+            if idx in segment_done and segment_path.exists():
+                finished.append((idx, segment_path))
+                return
+            segment_input = self._collect_segment_inputs([sections[idx - 1]], start=idx)
+            if not segment_input:
+                return
+            _, img_path, audio_path, duration = segment_input[0]
+            future = self._cpu_pool.submit(self._make_section_video, img_path, audio_path, duration,
+                                           segment_path, self._cpu_workers)
+            segment_tasks[future] = (idx, segment_path)
+
+        upstream = {}
+        pending = {}
+        for entry in image_manifest:
+            idx = entry["section_index"]
+            section = sections[idx - 1]
+            pending[idx] = 0
+            voice_file = f"{idx:02d}_{sanitize_filename(section['heading'])}.wav"
+            if not (idx in voice_done and self._reuse_voice(section, voice_file)):
+                upstream[self._io_pool.submit(self._generate_voice_section, idx, section, tts_config)] = ("voice", idx)
+                pending[idx] += 1
+            if not (idx in image_done and self._reuse_image(section, entry["filename"])):
+                image_config = ImageConfig(
+                    engine='stable_diffusion',
+                    model=entry["model"],
+                    size=image_meta.get('size', '512x512'),
+                    quality=image_meta.get('quality', 'standard'),
+                    fallback_engine='unsplash'
+                )
+                upstream[self._io_pool.submit(image_task, idx, section, image_config)] = ("image", idx)
+                pending[idx] += 1
+        try:
+            # Sections whose voice and image both survive from an earlier run go straight to encoding
+            for idx, count in pending.items():
+                if not count:
+                    queue_segment(idx)
+            for future in _progress_bar(as_completed(upstream), total=len(upstream), desc="Generating media", unit="asset"):
+                stage, idx = upstream[future]
+                if future.result():
+                    self._mark_progress(stage, idx)
+                pending[idx] -= 1
+                if not pending[idx]:
+                    queue_segment(idx)
+            for future in as_completed(segment_tasks):
+                if future.result():
+                    idx, segment_path = segment_tasks[future]
+                    self._mark_progress("segment", idx)
+                    finished.append((idx, segment_path))
+        finally:
+            self._maybe_flush_progress(force=True)
+        if not finished:
+            raise RuntimeError("No valid video segments to assemble")
+        # All sections are now marked complete, so these only write the voice/image manifests
+        self.generate_voice(script_data)
+        self.generate_images(script_data)
+        final_video_path = self._concatenate_segments([segment_path for _, segment_path in sorted(finished)])
+        # Segments are kept on failure so a resumed run only re-encodes the missing ones
+        self._clean_temp_dir(temp_dir)
+        logger.info(f"✅ Video assembled and saved to: {final_video_path}")
+        self.progress["video"] = True
+        self._save_progress()
+        return str(final_video_path)
 
-    def assemble_video(self, image_data: Dict[str, Any]) -> str:
+    def assemble_video(self, image_data: Dict[str, Any], per_segment: bool = False) -> str:
+        """
+        Render the final video with one ffmpeg graph over all sections. per_segment=True (or a failed
+        single pass) encodes one file per section and concatenates them instead, which is easier to debug.
+        """
         if self.progress.get("video"):
             logger.info("Video assembly already completed. Skipping.")
             return str(self.video_dir / self.config.final_video_name)
         sections = image_data.get('sections', [])
+        segment_inputs = self._collect_segment_inputs(sections)
+        if not segment_inputs:
+            raise RuntimeError("No valid video segments to assemble")
+        final_video_path = self.video_dir / self.config.final_video_name
+        if per_segment:
+            logger.info("Rendering per section (--per-segment)")
+            final_video_path = self._render_via_segments(segment_inputs)
+        elif len(segment_inputs) > _MAX_SINGLE_PASS_SECTIONS:
+            logger.info(f"{len(segment_inputs)} sections exceed the single-pass input limit; rendering per section")
+            final_video_path = self._render_via_segments(segment_inputs)
+        elif not self._render_single_pass(segment_inputs, final_video_path):
+            logger.warning("Single-pass render failed; falling back to per-section segments + concat")
+            final_video_path = self._render_via_segments(segment_inputs)
+        logger.info(f"✅ Video assembled and saved to: {final_video_path}")
+        self.progress["video"] = True
+        self._save_progress()
+        return str(final_video_path)
+
+    def _render_via_segments(self, segment_inputs: List[tuple]) -> Path:
+        """Fallback: encode one segment file per section, then stream-copy concatenate them."""
         temp_dir = self.video_dir / self.config.temp_dir_name
         ensure_directory(temp_dir)
         try:
-            segment_paths = self._create_video_segments(sections, temp_dir)
+            segment_paths = self._create_video_segments(segment_inputs, temp_dir)
             if not segment_paths:
                 raise RuntimeError("No valid video segments to assemble")
-            final_video_path = self._concatenate_segments(segment_paths)
-            logger.info(f"✅ Video assembled and saved to: {final_video_path}")
-            self.progress["video"] = True
-            self._save_progress()
-            return str(final_video_path)
+            return self._concatenate_segments(segment_paths)
         finally:
-            clean_temp_files(temp_dir)
+            self._clean_temp_dir(temp_dir)
 
-    def _create_video_segments(self, sections: List[Dict[str, Any]], temp_dir: Path) -> List[Path]:
-        segment_paths = []
-        for i, section in enumerate(sections):
+    def _collect_segment_inputs(self, sections: List[Dict[str, Any]], start: int = 1) -> List[tuple]:
+        """Validate sections and return (index, image path, audio path, duration) for each renderable one."""
+        segment_inputs = []
+        # One directory listing each instead of two stat calls per section; a single section just stats
+        if len(sections) > 1:
+            image_names = {entry.name for entry in os.scandir(self.images_dir)}
+            audio_names = {entry.name for entry in os.scandir(self.audio_dir)}
+        else:
+            image_names = audio_names = frozenset()
+        for i, section in enumerate(sections, start):
             img_file = section.get('image_file')
             audio_file = section.get('sound_file')
             duration = section.get('duration')
             if not all([img_file, audio_file, duration]):
-                logger.warning(f"Skipping section {i+1}: missing image/audio/duration")
+                logger.warning(f"Skipping section {i}: missing image/audio/duration")
                 continue
             img_path = self.images_dir / str(img_file)
             audio_path = self.audio_dir / str(audio_file)
-            validate_file_exists(img_path, f"Image for section {i+1}")
-            validate_file_exists(audio_path, f"Audio for section {i+1}")
-            segment_path = temp_dir / f"segment_{i+1:02d}.mp4"
-            logger.info(f"Creating segment {i+1}: {segment_path}")
+            if str(img_file) not in image_names:
+                validate_file_exists(img_path, f"Image for section {i}")
+            if str(audio_file) not in audio_names:
+                validate_file_exists(audio_path, f"Audio for section {i}")
             try:
                 duration_float = float(duration) if duration is not None else 0.0
                 if duration_float <= 0:
-                    logger.warning(f"Skipping section {i+1}: invalid duration {duration}")
+                    logger.warning(f"Skipping section {i}: invalid duration {duration}")
                     continue
             except (ValueError, TypeError):
-                logger.warning(f"Skipping section {i+1}: invalid duration {duration}")
+                logger.warning(f"Skipping section {i}: invalid duration {duration}")
                 continue
-            if self._make_section_video(img_path, audio_path, duration_float, segment_path):
-                segment_paths.append(segment_path)
-        return segment_paths
+            segment_inputs.append((i, img_path, audio_path, duration_float))
+        return segment_inputs
+
+    def _encoder_options(self, concurrent_encodes: int = 1) -> Dict[str, Any]:
+        """
+        Extra ffmpeg output options for the video encoder: thread count plus x264 preset/tune.
+        Threads are split across concurrent ffmpeg processes so parallel encodes do not oversubscribe the CPU.
+        """
+        video = self.config.video
+        threads = video.encode_threads
+        if threads <= 0 and concurrent_encodes > 1:
+            threads = max(1, (os.cpu_count() or 1) // concurrent_encodes)
+        options: Dict[str, Any] = {'threads': threads}
+        codec = self.video_codec
+        if codec == 'libx264':
+            options['preset'] = video.x264_preset
+            if video.x264_tune:
+                options['tune'] = video.x264_tune
+            if video.x264_tune == 'stillimage':
+                # Every frame of a section repeats the same image: extra references, B-frames and scene-cut
+                # detection cost CPU without saving bits; a 2 s GOP keeps seeking cheap
+                options['g'] = options['keyint_min'] = 2 * video.fps
+                options['x264-params'] = 'ref=1:bframes=0:scenecut=0'
+        else:
+            options.update(_HW_ENCODER_OPTIONS.get(codec, {}))
+        return options
+
+    @cached_property
+    def video_codec(self) -> str:
+        """The video encoder to use: a working hardware H.264 encoder when enabled and available, else the configured codec."""
+        video = self.config.video
+        if video.video_codec != 'libx264' or not video.hw_encoder:
+            return video.video_codec
+        encoder = detect_hw_encoder() if video.hw_encoder == 'auto' else video.hw_encoder
+        if encoder:
+            logger.info(f"Using hardware video encoder {encoder}")
+        return encoder or video.video_codec
+
+    def _normalized_streams(self, img_path: Path, audio_path: Path, duration: float):
+        """
+        Build a (video, audio) stream pair with identical parameters for every section: the image is looped,
+        fit and padded to the target resolution with square pixels at the target fps, and the audio is
+        resampled to 44.1 kHz stereo and padded/trimmed to exactly the section duration.
+        """
+        width, height = self.config.video.resolution
+        video = (
+            ffmpeg
+            .input(str(img_path), loop=1, t=duration, framerate=self.config.video.fps)
+            .filter('scale', width, height, force_original_aspect_ratio='decrease')
+            .filter('pad', width, height, '(ow-iw)/2', '(oh-ih)/2')
+            .filter('setsar', 1)
+            .filter('fps', fps=self.config.video.fps)
+        )
+        audio = (
+            ffmpeg
+            .input(str(audio_path))
+            .filter('aresample', 44100)
+            .filter('aformat', channel_layouts='stereo')
+            .filter('apad', whole_dur=duration)
+            .filter('atrim', duration=duration)
+        )
+        return video, audio
 
-    def _make_section_video(self, img_path: Path, audio_path: Path, duration: float, out_path: Path) -> bool:
+    def _render_single_pass(self, segment_inputs: List[tuple], out_path: Path) -> bool:
+        """
+        Render all sections with one ffmpeg process: every image/audio pair is normalized
+        (size, SAR, fps, sample format) and joined by the concat filter, so no segment files are written.
+        """
+        streams = []
+        for _, img_path, audio_path, duration in segment_inputs:
+            streams.extend(self._normalized_streams(img_path, audio_path, duration))
+        joined = ffmpeg.concat(*streams, v=1, a=1).node
         try:
-            video_stream = (
+            logger.info(f"Rendering {len(segment_inputs)} sections into {out_path} in a single pass")
+            (
                 ffmpeg
-                .input(str(img_path), loop=1, t=duration)
-                .filter('scale', self.config.video.resolution[0], self.config.video.resolution[1], 
-                       force_original_aspect_ratio='decrease')
+                .output(joined[0], joined[1], str(out_path),
+                        vcodec=self.video_codec,
+                        acodec=self.config.video.audio_codec,
+                        pix_fmt=self.config.video.pixel_format,
+                        r=self.config.video.fps,
+                        **self._encoder_options())
+                .overwrite_output()
+                .run(quiet=True)
             )
-            audio_stream = ffmpeg.input(str(audio_path))
+            return True
+        except ffmpeg.Error as e:
+            logger.error(f"FFmpeg single-pass render failed: {e.stderr.decode() if hasattr(e, 'stderr') else e}")
+            return False
+
+    def _create_video_segments(self, segment_inputs: List[tuple], temp_dir: Path) -> List[Path]:
+        """Encode the section segments concurrently; returns the successful segment paths in section order."""
+        tasks = {}
+        for i, img_path, audio_path, duration in segment_inputs:
+            segment_path = temp_dir / f"segment_{i:02d}.mp4"
+            logger.info(f"Creating segment {i}: {segment_path}")
+            future = self._cpu_pool.submit(self._make_section_video, img_path, audio_path, duration,
+                                           segment_path, self._cpu_workers)
+            tasks[future] = (i, segment_path)
+        done = [tasks[future] for future in as_completed(tasks) if future.result()]
+        return [segment_path for _, segment_path in sorted(done)]
+
+    def _make_section_video(self, img_path: Path, audio_path: Path, duration: float, out_path: Path,
+                            concurrent_encodes: int = 1) -> bool:
+        encoder_options = self._encoder_options(concurrent_encodes)
+        try:
+            if self.config.video.fast_still_image:
+                # Identical stream parameters in every segment keep the stream-copy concat valid
+                video_stream, audio_stream = self._normalized_streams(img_path, audio_path, duration)
+                if self.video_codec == 'libx264':
+                    encoder_options.update(preset='ultrafast', tune='stillimage')
+            else:
+                video_stream = (
+                    ffmpeg
+                    .input(str(img_path), loop=1, t=duration)
+                    .filter('scale', self.config.video.resolution[0], self.config.video.resolution[1], 
+                           force_original_aspect_ratio='decrease')
+                )
+                audio_stream = ffmpeg.input(str(audio_path))
             (
                 ffmpeg
                 .output(video_stream, audio_stream, str(out_path), 
-                       vcodec=self.config.video.video_codec, 
+                       vcodec=self.video_codec, 
                        acodec=self.config.video.audio_codec, 
                        pix_fmt=self.config.video.pixel_format, 
-                       t=duration, r=self.config.video.fps, shortest=None, y=None)
+                       t=duration, r=self.config.video.fps, shortest=None, y=None,
+                       **encoder_options)
                 .overwrite_output()
                 .run(quiet=True)
             )
@@ -409,9 +954,7 @@ class VideoPipeline:
 
     def _concatenate_segments(self, segment_paths: List[Path]) -> Path:
         concat_file = segment_paths[0].parent / 'concat_list.txt'
-        with open(concat_file, 'w') as f:
-            for seg in segment_paths:
-                f.write(f"file '{seg.absolute()}'\n")
+        concat_file.write_text("".join(f"file '{seg.absolute()}'\n" for seg in segment_paths))
         final_video_path = self.video_dir / self.config.final_video_name
         concat_cmd = (
             ffmpeg
@@ -426,6 +969,10 @@ class VideoPipeline:
             raise RuntimeError(f"Failed to concatenate video: {e.stderr.decode() if hasattr(e, 'stderr') else e}")
 
     def load_step_data(self, step: str) -> Dict[str, Any]:
+        """
+        Load the pipeline state as of a completed step. voice.json and images.json only hold per-section
+        manifests, so the full data is rebuilt from script.json plus the files those manifests recorded.
+        """
         step_files = {
             'script': self.scripts_dir / "script.json",
             'voice': self.audio_dir / "voice.json",
@@ -435,4 +982,25 @@ class VideoPipeline:
             raise ValueError(f"Unknown step: {step}. Available: {list(step_files.keys())}")
         file_path = step_files[step]
         validate_file_exists(file_path, f"{step.capitalize()} data")
-        return load_json(file_path) 
\ No newline at end of file
+        if step == 'script':
+            return load_json(file_path)
+        script_path = step_files['script']
+        validate_file_exists(script_path, "Script data")
+        script_data = load_json(script_path)
+        sections = script_data.get('sections', [])
+        self._apply_manifest(sections, step_files['voice'], 'sound_file', self.audio_dir)
+        if step == 'images':
+            self._apply_manifest(sections, file_path, 'image_file', self.images_dir)
+        return script_data
+
+    @staticmethod
+    def _apply_manifest(sections: List[Dict[str, Any]], manifest_path: Path, key: str, directory: Path) -> None:
+        """Set section[key] from a voice/images manifest for every listed file that exists in directory."""
+        if not manifest_path.exists():
+            return
+        present = {entry.name for entry in os.scandir(directory)}
+        for entry in load_json(manifest_path):
+            idx = entry.get('section_index', 0)
+            filename = entry.get('filename')
+            if 1 <= idx <= len(sections) and filename in present:
+                sections[idx - 1][key] = filename
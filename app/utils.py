@@ -2,60 +2,111 @@
 Utility functions for the video production pipeline.
 """
 
+import ast
+import hashlib
 import logging
+import os
 import re
+import threading
+import time
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, Any, Callable, List
 import importlib.util
 import sys
+from app import _json
 
 def setup_logging(level: str = "INFO") -> logging.Logger:
-    logging.basicConfig(
-        level=getattr(logging, level.upper()),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler('pipeline.log')
-        ]
-    )
+    """
+    Configure root logging once: console plus a size-capped pipeline.log. Records are handed to a
+    background thread through a queue, so pool workers never block on log I/O.
+    """
+    import atexit
+    import queue
+    from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+    root = logging.getLogger()
+    if root.hasHandlers():
+        return logging.getLogger(__name__)
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = [
+        logging.StreamHandler(),
+        RotatingFileHandler('pipeline.log', maxBytes=10 * 1024 * 1024, backupCount=3, delay=True)
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    root.setLevel(getattr(logging, level.upper()))
+    root.addHandler(QueueHandler(log_queue))
     return logging.getLogger(__name__)
 
+_UNSAFE_CHARS = '<>:"/\\|?*'
+# ASCII handled in one C-level pass: unsafe characters dropped, other non-word characters (besides - and .) to '_'
+_ASCII_SAFE_TABLE = str.maketrans({
+    c: (None if c in _UNSAFE_CHARS else '_')
+    for c in map(chr, range(128)) if not (c.isalnum() or c in '_-.')
+})
+_UNSAFE_RE = re.compile(r'[<>:"/\\|?*]')
+_NONWORD_RE = re.compile(r'[^\w\-_.]')
+_DUP_UNDER_RE = re.compile(r'_+')
+
+@lru_cache(maxsize=1024)
 def sanitize_filename(text: str) -> str:
-    safe = re.sub(r'[<>:"/\\|?*]', '', text)
-    safe = re.sub(r'[^\w\-_.]', '_', safe)
-    safe = re.sub(r'_+', '_', safe)
+    """Turn a heading into a filesystem-safe name (memoized; each heading is sanitized in several pipeline steps)."""
+    if text.isascii():
+        safe = text.translate(_ASCII_SAFE_TABLE)
+    else:
+        # Unicode word characters are kept, so non-ASCII text needs the regexes
+        safe = _NONWORD_RE.sub('_', _UNSAFE_RE.sub('', text))
+    safe = _DUP_UNDER_RE.sub('_', safe)
     safe = safe.strip('_')
     return safe or "untitled"
 
 def create_numbered_directory(base_dir: str, name: str) -> Path:
+    """Create base_dir/NN_name numbered one past the highest existing NN_name, found with a single directory scan."""
     base_path = Path(base_dir)
     base_path.mkdir(exist_ok=True)
-    counter = 1
+    suffix = f"_{name}"
+    counters = [0]
+    with os.scandir(base_path) as entries:
+        for entry in entries:
+            prefix = entry.name[:-len(suffix)] if entry.name.endswith(suffix) else ''
+            if prefix.isdigit():
+                counters.append(int(prefix))
+    counter = max(counters) + 1
     while True:
         numbered_dir = base_path / f"{counter:02d}_{name}"
-        if not numbered_dir.exists():
-            numbered_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            numbered_dir.mkdir(parents=True)
             return numbered_dir
-        counter += 1
+        except FileExistsError:  # another run took this number since the scan
+            counter += 1
 
-def save_json(data: Any, file_path: Path) -> None:
-    """Save a dict or list as JSON to the given file path."""
-    import json
+def save_json(data: Any, file_path: Path, durable: bool = True) -> None:
+    """
+    Save a dict or list as JSON to the given file path (written to a temp file, then atomically renamed).
+    durable=True also fsyncs the data before the rename; pass False for state that is cheap to lose.
+    """
     try:
         file_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(file_path, 'w') as f:
-            json.dump(data, f, indent=2)
+        tmp_path = file_path.with_name(file_path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(_json.dumps(data, indent=True))
+            if durable:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
     except Exception as e:
         raise RuntimeError(f"Failed to save JSON to {file_path}: {e}")
 
 def load_json(file_path: Path) -> Dict[str, Any]:
-    import json
     try:
-        with open(file_path, 'r') as f:
-            return json.load(f)
+        return _json.load(file_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"File not found: {file_path}")
-    except json.JSONDecodeError as e:
+    except _json.JSONDecodeError as e:
         raise ValueError(f"Invalid JSON in {file_path}: {e}")
     except Exception as e:
         raise RuntimeError(f"Failed to load JSON from {file_path}: {e}")
@@ -87,34 +138,189 @@ def validate_file_exists(file_path: Path, description: str = "File") -> None:
     if not file_path.exists():
         raise FileNotFoundError(f"{description} not found: {file_path}")
 
-def clean_temp_files(temp_dir: Path) -> None:
-    import shutil
+def clean_temp_files(temp_dir: Path, cache_dir: Path = None, cache_max_age_days: float = 30,
+                     cache_max_bytes: int = None) -> None:
+    """
+    Remove temp_dir; if cache_dir is given, also drop content-cache entries unused for cache_max_age_days
+    and, with cache_max_bytes, the least recently used entries beyond that size.
+    """
     try:
-        if temp_dir.exists():
-            shutil.rmtree(temp_dir)
+        _remove_tree(temp_dir)
     except Exception as e:
         logging.warning(f"Failed to clean temp directory {temp_dir}: {e}")
+    if cache_dir is not None:
+        prune_content_cache(cache_dir, cache_max_age_days, cache_max_bytes)
+
+def _remove_tree(directory: Path) -> None:
+    """Delete directory; a flat one (the usual segment dir) takes one scandir and an unlink per file, not rmtree."""
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except FileNotFoundError:
+        return
+    if any(entry.is_dir(follow_symlinks=False) for entry in entries):
+        import shutil
+        shutil.rmtree(directory)
+        return
+    for entry in entries:
+        os.unlink(entry.path)
+    os.rmdir(directory)
+
+def content_cache_path(cache_dir: Path, kind: str, key: str, suffix: str) -> Path:
+    """Return the content-addressed location for key (its sha256) under cache_dir/kind."""
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return Path(cache_dir) / kind / f"{digest}{suffix}"
+
+def prune_content_cache(cache_dir: Path, max_age_days: float, max_bytes: int = None) -> int:
+    """
+    Delete cache files whose mtime is older than max_age_days, then, if max_bytes is given, the least recently
+    used files (oldest mtime; hits refresh it) until the cache fits; returns the number removed.
+    """
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    kept = []
+    try:
+        kinds = [entry.path for entry in os.scandir(cache_dir) if entry.is_dir()]
+    except FileNotFoundError:
+        return 0
+    for kind_dir in kinds:
+        for entry in os.scandir(kind_dir):
+            try:
+                if not entry.is_file():
+                    continue
+                st = entry.stat()
+                if st.st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    removed += 1
+                else:
+                    kept.append((st.st_mtime, st.st_size, entry.path))
+            except OSError as e:
+                logging.warning(f"Failed to prune cache entry {entry.path}: {e}")
+    if max_bytes is not None:
+        total = sum(size for _, size, _ in kept)
+        for _, size, path in sorted(kept):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+                removed += 1
+                total -= size
+            except OSError as e:
+                logging.warning(f"Failed to prune cache entry {path}: {e}")
+    return removed
+
+def register_engine(name: str) -> Callable:
+    """
+    Decorator for plugin modules: expose the decorated function as engine `name`.
+    discover_plugins reads these decorators from the source without importing the module,
+    so name must be a string literal.
+    """
+    def decorator(func: Callable) -> Callable:
+        return func
+    return decorator
+
+class LazyPlugin:
+    """Stand-in for a plugin function; the plugin module is imported on first call, not at discovery."""
+
+    _import_lock = threading.RLock()
+
+    def __init__(self, path: Path, module_name: str, func_name: str):
+        self.path = path
+        self.module_name = module_name
+        self.func_name = func_name
+        self._func = None
+        self._error = None
+
+    def __repr__(self) -> str:
+        return f"<LazyPlugin {self.module_name}.{self.func_name}>"
+
+    def load(self) -> Callable:
+        """Import the plugin module if needed and return the real function; import errors are remembered."""
+        if self._func is None:
+            with self._import_lock:
+                if self._func is None:
+                    if self._error is not None:
+                        raise self._error
+                    try:
+                        self._func = getattr(_import_plugin_module(self.path, self.module_name), self.func_name)
+                    except Exception as e:
+                        logging.warning(f"Failed to import plugin {self.module_name}: {e}")
+                        self._error = e
+                        raise
+        return self._func
+
+    @property
+    def module(self):
+        self.load()
+        return sys.modules[self.module_name]
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+def _import_plugin_module(py_file: Path, module_name: str):
+    module = sys.modules.get(module_name)
+    if module is not None and getattr(module, '__file__', None) == str(py_file):
+        return module
+    spec = importlib.util.spec_from_file_location(module_name, py_file)
+    if not spec or not spec.loader:
+        raise ImportError(f"Cannot load plugin {py_file}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[module_name]
+        raise
+    return module
+
+def _plugin_entry_points(tree: ast.Module, module_name: str, function_prefix: str) -> Dict[str, str]:
+    """Map engine name -> function name for one plugin module's syntax tree."""
+    functions = [node for node in tree.body if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))]
+    registered = {}
+    for node in functions:
+        for deco in node.decorator_list:
+            if (isinstance(deco, ast.Call) and getattr(deco.func, 'id', getattr(deco.func, 'attr', None)) == 'register_engine'
+                    and deco.args and isinstance(deco.args[0], ast.Constant) and isinstance(deco.args[0].value, str)):
+                registered[deco.args[0].value.lower()] = node.name
+    if registered:
+        return registered
+    # Undecorated modules: the last prefixed function in dir() (alphabetical) order, as before
+    prefixed = sorted(node.name for node in functions if node.name.startswith(function_prefix))
+    if not prefixed:
+        return {}
+    return {module_name.replace('tts_', '').replace('generate_', ''): prefixed[-1]}
 
 def discover_plugins(directory: Path, function_prefix: str) -> dict:
+    """
+    Return {engine name: LazyPlugin} for the plugin modules in directory, found by parsing their source;
+    a module is only imported when one of its engines is first called.
+    Modules declare engines with @register_engine; a module without declarations falls back to its
+    functions named with function_prefix, under the module name minus its tts_/generate_ prefix.
+    Results are cached until a plugin file is added, removed or modified.
+    """
+    directory = Path(directory).resolve()
+    with os.scandir(directory) as it:
+        files = tuple(sorted((entry.name, entry.stat().st_mtime_ns) for entry in it
+                             if entry.name.endswith('.py') and entry.name != '__init__.py'
+                             and entry.is_file(follow_symlinks=False)))
+    return dict(_discover_plugins(directory, function_prefix, files))
+
+@lru_cache(maxsize=32)
+def _discover_plugins(directory: Path, function_prefix: str, files: tuple) -> Dict[str, LazyPlugin]:
     plugins = {}
-    for py_file in directory.glob('*.py'):
-        if py_file.name == '__init__.py':
-            continue
+    markers = (b'register_engine', function_prefix.encode())
+    for name, _ in files:
+        py_file = directory / name
         module_name = py_file.stem
-        spec = importlib.util.spec_from_file_location(module_name, py_file)
-        if not spec or not spec.loader:
+        source = py_file.read_bytes()
+        # Helper modules that neither register engines nor define prefixed functions need no parse
+        if not any(marker in source for marker in markers):
             continue
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[module_name] = module
         try:
-            spec.loader.exec_module(module)
-        except Exception as e:
+            tree = ast.parse(source, filename=str(py_file))
+        except (SyntaxError, ValueError) as e:
             logging.warning(f"Failed to import plugin {module_name}: {e}")
             continue
-        for attr in dir(module):
-            if attr.startswith(function_prefix):
-                func = getattr(module, attr)
-                if callable(func):
-                    engine_name = module_name.replace('tts_', '').replace('generate_', '')
-                    plugins[engine_name] = func
-    return plugins 
\ No newline at end of file
+        for engine_name, func_name in _plugin_entry_points(tree, module_name, function_prefix).items():
+            plugins[engine_name] = LazyPlugin(py_file, module_name, func_name)
+    return plugins
@@ -1,9 +1,28 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from io import BytesIO
-from dotenv import load_dotenv
+from app.config import load_env_once
+from app.utils import register_engine
 
+def _new_session():
+    """
+    Keep-alive session for the OpenAI API. Image downloads (GET) retry rate limits and transient server errors
+    with backoff; generation requests (POST) are not retried, since a 5xx may still have produced a billed image.
+    """
+    retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504],
+                  allowed_methods=frozenset({"GET"}), raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_SESSION = _new_session()
+
+@register_engine("dalle")
 def generate_dalle_image(prompt: str, output_path: str, model: str = "dall-e-3", size: str = "1024x1024", quality: str = "standard") -> None:
     """
     Generate an image using OpenAI's DALL-E API.
@@ -15,7 +34,7 @@ def generate_dalle_image(prompt: str, output_path: str, model: str = "dall-e-3",
         size (str): Image size (1024x1024, 1792x1024, 1024x1792 for DALL-E-3)
         quality (str): Image quality (standard, hd for DALL-E-3)
     """
-    load_dotenv()
+    load_env_once()
     api_key = os.getenv("OPENAI_API_KEY")
     
     if not api_key:
@@ -43,7 +62,7 @@ def generate_dalle_image(prompt: str, output_path: str, model: str = "dall-e-3",
     
     try:
         print(f"Generating DALL-E image with model: {model}")
-        response = requests.post(url, headers=headers, json=data, timeout=60)
+        response = _SESSION.post(url, headers=headers, json=data, timeout=60)
         response.raise_for_status()
         
         result = response.json()
@@ -51,13 +70,12 @@ def generate_dalle_image(prompt: str, output_path: str, model: str = "dall-e-3",
         if "data" in result and len(result["data"]) > 0:
             image_url = result["data"][0]["url"]
             
-            # Download the image
-            image_response = requests.get(image_url, timeout=30)
-            image_response.raise_for_status()
-            
-            # Save the image
-            with open(output_path, "wb") as f:
-                f.write(image_response.content)
+            # Download the image, streaming it to disk in 64 KiB chunks
+            with _SESSION.get(image_url, timeout=30, stream=True) as image_response:
+                image_response.raise_for_status()
+                with open(output_path, "wb") as f:
+                    for chunk in image_response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
             
             print(f"\u2713 DALL-E image generated and saved to: {output_path}")
         else:
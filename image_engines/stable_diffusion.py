@@ -1,10 +1,126 @@
 import os
-from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion import StableDiffusionPipeline
-import torch
+import threading
+from functools import lru_cache
 from PIL import Image
-import numpy as np
+from app.utils import register_engine
 
-def generate_sd_image(prompt: str, output_path: str, model: str = "runwayml/stable-diffusion-v1-5") -> None:
+DEFAULT_MODEL = "runwayml/stable-diffusion-v1-5"
+# DPM-Solver++ reaches the quality of 20 default-scheduler steps in about 15
+_PIPE_KWARGS = dict(num_inference_steps=15, guidance_scale=7.5, width=512, height=512)
+
+# Loaded pipelines keyed by (model, device, dtype), each with a lock: a pipeline is not safe to run concurrently
+_SD_PIPE_CACHE = {}
+_SD_PIPE_CACHE_LOCK = threading.Lock()
+
+@lru_cache(maxsize=1)
+def _select_device():
+    """Pick (device, dtype) for Apple Silicon, CUDA, or CPU; probed once per process."""
+    import torch
+    print(f"Torch version: {torch.__version__}")
+    print(f"MPS available: {torch.backends.mps.is_available()}")
+    print(f"CUDA available: {torch.cuda.is_available()}")
+    if torch.cuda.is_available():
+        device = "cuda"
+        dtype = torch.float16
+    elif torch.backends.mps.is_available():
+        device = "mps"
+        dtype = torch.float16  # _get_pipe falls back to float32 if a warmup step fails or yields NaN latents
+    else:
+        device = "cpu"
+        dtype = torch.float32
+    print(f"Using device: {device}, dtype: {dtype}")
+    return device, dtype
+
+def _get_pipe(model, device, dtype):
+    """Return the cached (pipeline, lock) for model on device, loading and moving the weights only once."""
+    key = (model, device, dtype)
+    with _SD_PIPE_CACHE_LOCK:
+        if key not in _SD_PIPE_CACHE:
+            pipe = _load_pipe(model, device, dtype)
+            if device == "mps" and dtype != _float32():
+                # Half precision is not supported by every op on every macOS release; where it runs but
+                # overflows, the latents come back NaN (black images) without raising
+                problem = _fp16_warmup_problem(pipe)
+                if problem:
+                    print(f"float16 warmup failed on MPS ({problem}); using float32")
+                    pipe = _load_pipe(model, device, _float32())
+            _SD_PIPE_CACHE[key] = (pipe, threading.Lock())
+        return _SD_PIPE_CACHE[key]
+
+def _fp16_warmup_problem(pipe):
+    """Run one denoising step; return why half precision is unusable on this device, or None if it works."""
+    import torch
+    try:
+        latents = _run_pipe(pipe, prompt="", num_inference_steps=1, output_type="latent").images
+    except Exception as e:
+        return str(e)
+    if torch.isnan(latents).any():
+        return "NaN latents"
+    return None
+
+def _float32():
+    import torch
+    return torch.float32
+
+def _load_pipe(model, device, dtype):
+    import torch
+    from diffusers import DPMSolverMultistepScheduler
+    from diffusers.pipelines.stable_diffusion.pipeline_stable_diffusion import StableDiffusionPipeline
+    print(f"Loading Stable Diffusion model: {model} ({dtype})")
+    pipe = StableDiffusionPipeline.from_pretrained(
+        model,
+        torch_dtype=dtype,
+        safety_checker=None  # Disable safety checker for faster generation
+    )
+    pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
+    # from_pretrained already loaded the weights in dtype; only recast a submodule that did not follow it
+    for module in (pipe.unet, pipe.vae, pipe.text_encoder):
+        if next(module.parameters()).dtype != dtype:
+            module.to(dtype)
+    pipe = pipe.to(device)
+    pipe.enable_attention_slicing()
+    pipe.enable_vae_slicing()
+    pipe.unet.to(memory_format=torch.channels_last)
+    if os.getenv("SD_QUANT", "").lower() == "int8" and device != "cpu":
+        _quantize_unet(pipe, device)
+    if device == "cuda":
+        try:
+            pipe.enable_xformers_memory_efficient_attention()
+        except Exception as e:
+            print(f"xformers attention unavailable: {e}")
+        # Opt-in (SD_COMPILE=1): each new batch shape recompiles the UNet, which only pays off over many images
+        if os.getenv("SD_COMPILE", "").lower() in ("1", "true", "yes"):
+            try:
+                pipe.unet = torch.compile(pipe.unet, mode="reduce-overhead", fullgraph=False)
+            except Exception as e:
+                print(f"torch.compile unavailable: {e}")
+    return pipe
+
+def _quantize_unet(pipe, device):
+    """
+    Quantize the UNet weights to int8 (SD_QUANT=int8): torchao on CUDA, optimum-quanto elsewhere.
+    The VAE is left alone because it is sensitive to quantization; missing packages keep the full-precision UNet.
+    """
+    try:
+        if device == "cuda":
+            from torchao.quantization import int8_weight_only, quantize_
+            quantize_(pipe.unet, int8_weight_only())
+        else:
+            from optimum.quanto import freeze, qint8, quantize
+            quantize(pipe.unet, weights=qint8)
+            freeze(pipe.unet)
+        print("Quantized UNet weights to int8")
+    except Exception as e:
+        print(f"int8 quantization unavailable: {e}")
+
+def _run_pipe(pipe, **kwargs):
+    """Call pipe without autograd bookkeeping."""
+    import torch
+    with torch.inference_mode():
+        return pipe(**kwargs)
+
+@register_engine("stable_diffusion")
+def generate_sd_image(prompt: str, output_path: str, model: str = DEFAULT_MODEL) -> None:
     """
     Generate an image using Stable Diffusion locally.
     
@@ -14,41 +130,13 @@ def generate_sd_image(prompt: str, output_path: str, model: str = "runwayml/stab
         model (str): Model name or path (default: runwayml/stable-diffusion-v1-5)
     """
     try:
-        print(f"Torch version: {torch.__version__}")
-        print(f"MPS available: {torch.backends.mps.is_available()}")
-        print(f"CUDA available: {torch.cuda.is_available()}")
-        # Device and dtype selection for Apple Silicon, CUDA, or CPU
-        if torch.cuda.is_available():
-            device = "cuda"
-            dtype = torch.float16
-        elif torch.backends.mps.is_available():
-            device = "mps"
-            dtype = torch.float32  # float32 is safer for MPS
-        else:
-            device = "cpu"
-            dtype = torch.float32
-        print(f"Using device: {device}, dtype: {dtype}")
-        print(f"Loading Stable Diffusion model: {model}")
-        
-        pipe = StableDiffusionPipeline.from_pretrained(
-            model,
-            torch_dtype=dtype,
-            safety_checker=None  # Disable safety checker for faster generation
-        )
-        # Force submodules to correct dtype before moving to device
-        pipe.unet.to(dtype)
-        pipe.vae.to(dtype)
-        pipe.text_encoder.to(dtype)
-            pipe = pipe.to(device)
+        import numpy as np
+        import torch
+        pipe, pipe_lock = _get_pipe(model, *_select_device())
         
         print(f"Generating Stable Diffusion image...")
-        result = pipe(
-            prompt=prompt,
-            num_inference_steps=20,
-            guidance_scale=7.5,
-            width=512,
-            height=512
-        )
+        with pipe_lock:
+            result = _run_pipe(pipe, prompt=prompt, **_PIPE_KWARGS)
         image = None
         if not isinstance(result, tuple) and hasattr(result, 'images'):
             image = result.images[0]
@@ -57,11 +145,12 @@ def generate_sd_image(prompt: str, output_path: str, model: str = "runwayml/stab
             if isinstance(img_candidate, Image.Image):
                 image = img_candidate
             elif isinstance(img_candidate, torch.Tensor):
-                arr = img_candidate.detach().cpu().numpy()
-                if arr.ndim == 3 and arr.shape[0] in (1, 3):
-                    arr = np.transpose(arr, (1, 2, 0))
-                arr = (arr * 255).clip(0, 255).astype(np.uint8)
-                image = Image.fromarray(arr)
+                # Scale and quantize on the device so only a uint8 copy crosses to the CPU
+                t = img_candidate.detach()
+                if t.ndim == 3 and t.shape[0] in (1, 3):
+                    t = t.permute(1, 2, 0)
+                t = t.clamp(0, 1).mul(255).to(torch.uint8)
+                image = Image.fromarray(t.contiguous().cpu().numpy())
             elif isinstance(img_candidate, np.ndarray):
                 arr = img_candidate
                 if arr.ndim == 3 and arr.shape[0] in (1, 3):
@@ -77,4 +166,33 @@ def generate_sd_image(prompt: str, output_path: str, model: str = "runwayml/stab
         image.save(output_path)
         print(f"\u2713 Stable Diffusion image generated and saved to: {output_path}")
     except Exception as e:
-        raise RuntimeError(f"Failed to generate Stable Diffusion image: {str(e)}") 
\ No newline at end of file
+        raise RuntimeError(f"Failed to generate Stable Diffusion image: {str(e)}") 
+
+def generate_sd_images_batch(prompts, output_paths, model=DEFAULT_MODEL, batch_size=4):
+    """
+    Generate one image per prompt, running up to batch_size prompts through each diffusion loop.
+    
+    Args:
+        prompts (list[str]): Text prompts
+        output_paths (list[str]): Where to save each prompt's image
+        model (str): Model name or path (default: runwayml/stable-diffusion-v1-5)
+        batch_size (int): Prompts per pipeline call
+    """
+    try:
+        pipe, pipe_lock = _get_pipe(model, *_select_device())
+        for start in range(0, len(prompts), batch_size):
+            chunk = prompts[start:start + batch_size]
+            print(f"Generating {len(chunk)} Stable Diffusion images in one batch...")
+            with pipe_lock:
+                result = _run_pipe(pipe, prompt=chunk, **_PIPE_KWARGS)
+            for image, path in zip(result.images, output_paths[start:start + batch_size]):
+                image.save(path)
+                print(f"\u2713 Stable Diffusion image generated and saved to: {path}")
+    except Exception as e:
+        raise RuntimeError(f"Failed to generate Stable Diffusion images: {str(e)}")
+
+def batch(items, model=None, size=None, quality=None):
+    """Batch entry point used by EngineManager: items are (prompt, output_path) pairs."""
+    prompts = [prompt for prompt, _ in items]
+    paths = [path for _, path in items]
+    generate_sd_images_batch(prompts, paths, model or DEFAULT_MODEL, batch_size=len(items))
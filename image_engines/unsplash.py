@@ -1,9 +1,24 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from PIL import Image
 from io import BytesIO
-from dotenv import load_dotenv
+from app.config import load_env_once
+from app.utils import register_engine
 
+def _new_session():
+    """Keep-alive session for the Unsplash API; retries rate limits and transient server errors with backoff."""
+    retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504], raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+_SESSION = _new_session()
+
+@register_engine("unsplash")
 def generate_unsplash_image(prompt: str, output_path: str) -> None:
     """
     Search and download an image from Unsplash based on the prompt.
@@ -12,7 +27,7 @@ def generate_unsplash_image(prompt: str, output_path: str) -> None:
         prompt (str): The search query for finding relevant images
         output_path (str): Path to save the downloaded image
     """
-    load_dotenv()
+    load_env_once()
     access_key = os.getenv("UNSPLASH_ACCESS_KEY")
     
     if not access_key:
@@ -33,7 +48,7 @@ def generate_unsplash_image(prompt: str, output_path: str) -> None:
     
     try:
         print(f"Searching Unsplash for: {prompt}")
-        response = requests.get(search_url, headers=headers, params=params, timeout=30)
+        response = _SESSION.get(search_url, headers=headers, params=params, timeout=30)
         response.raise_for_status()
         
         data = response.json()
@@ -45,12 +60,11 @@ def generate_unsplash_image(prompt: str, output_path: str) -> None:
             
             # Download the image
             print(f"Downloading image: {photo['alt_description'] or 'No description'}")
-            image_response = requests.get(photo_url, timeout=30)
-            image_response.raise_for_status()
-            
-            # Save the image
-            with open(output_path, "wb") as f:
-                f.write(image_response.content)
+            with _SESSION.get(photo_url, timeout=30, stream=True) as image_response:
+                image_response.raise_for_status()
+                with open(output_path, "wb") as f:
+                    for chunk in image_response.iter_content(chunk_size=64 * 1024):
+                        f.write(chunk)
             
             print(f"\u2713 Unsplash image downloaded and saved to: {output_path}")
             print(f"  Photo by: {photo['user']['name']} on Unsplash")
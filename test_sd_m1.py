@@ -1,5 +1,5 @@
 import torch
-from diffusers import StableDiffusionPipeline
+from diffusers import DPMSolverMultistepScheduler, StableDiffusionPipeline
 
 prompt = "A fantasy landscape, trending on artstation"
 model = "runwayml/stable-diffusion-v1-5"
@@ -19,8 +19,18 @@ pipe = StableDiffusionPipeline.from_pretrained(
     torch_dtype=dtype,
     safety_checker=None
 )
+pipe.scheduler = DPMSolverMultistepScheduler.from_config(pipe.scheduler.config)
 pipe = pipe.to(device)
+pipe.enable_attention_slicing()
+pipe.enable_vae_slicing()
+pipe.unet.to(memory_format=torch.channels_last)
+if device == "cuda":
+    try:
+        pipe.enable_xformers_memory_efficient_attention()
+    except Exception as e:
+        print(f"xformers attention unavailable: {e}")
 
-image = pipe(prompt, num_inference_steps=20, guidance_scale=7.5).images[0]
+with torch.inference_mode():
+    image = pipe(prompt, num_inference_steps=15, guidance_scale=7.5).images[0]
 image.save("test_sd_m1.png")
 print("Image saved as test_sd_m1.png") 
\ No newline at end of file
@@ -0,0 +1,37 @@
+import threading
+
+import pytest
+
+from app.batching import EngineBatcher
+
+def test_concurrent_requests_share_a_batch():
+    batches = []
+    release = threading.Event()
+
+    def batch_fn(payloads):
+        release.wait(1)
+        batches.append(list(payloads))
+        return [p * 2 if p != 3 else ValueError("bad") for p in payloads]
+
+    batcher = EngineBatcher(batch_fn, batch_size=4, max_wait_ms=200)
+    futures = [batcher.submit(i) for i in range(5)]
+    release.set()
+    assert [f.result(timeout=2) for f in futures[:3]] == [0, 2, 4]
+    with pytest.raises(ValueError):
+        futures[3].result(timeout=2)
+    assert futures[4].result(timeout=2) == 8
+    batcher.close()
+    assert [len(b) for b in batches] == [4, 1]
+
+def test_batch_failure_fails_every_request():
+    def batch_fn(payloads):
+        raise RuntimeError("engine down")
+
+    batcher = EngineBatcher(batch_fn, batch_size=2, max_wait_ms=10)
+    futures = [batcher.submit(i) for i in range(2)]
+    for f in futures:
+        with pytest.raises(RuntimeError):
+            f.result(timeout=2)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit(0)
@@ -0,0 +1,12 @@
+import dataclasses
+
+import pytest
+
+from app.config import PipelineConfig
+
+def test_pipeline_config_from_env(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "from-env")
+    config = PipelineConfig.from_env(openai_api_key="explicit")
+    assert (config.gemini_api_key, config.openai_api_key) == ("from-env", "explicit")
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        config.video.fps = 30
@@ -0,0 +1,36 @@
+from app import engines
+
+def test_positional_arity():
+    def two(prompt, output_path): pass
+    def three(prompt, output_path, model="m"): pass
+    def five(prompt, output_path, model="m", size="s", quality="q"): pass
+    def star(*args): pass
+    assert [engines._positional_arity(f) for f in (two, three, five)] == [2, 3, 5]
+    assert engines._positional_arity(star) >= 5
+
+def test_espeak_batch_kills_started_processes_when_spawn_fails(monkeypatch):
+    import io
+    import pytest
+    from tts_engines import tts_espeak
+    started = []
+
+    class FakeProc:
+        def __init__(self, cmd, **kwargs):
+            if started:
+                raise OSError("too many open files")
+            self.stdin = io.StringIO()
+            self.killed = self.waited = False
+            started.append(self)
+
+        def kill(self):
+            self.killed = True
+
+        def wait(self):
+            self.waited = True
+            return -9
+
+    monkeypatch.setattr(tts_espeak, "_espeak_cmd", lambda: "espeak")
+    monkeypatch.setattr(tts_espeak.subprocess, "Popen", FakeProc)
+    with pytest.raises(OSError):
+        tts_espeak.batch([("one", "1.wav"), ("two", "2.wav")])
+    assert started[0].killed and started[0].waited
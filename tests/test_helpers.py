@@ -0,0 +1,91 @@
+import app.helpers as helpers
+
+def test_download_images_batch_preserves_order_and_errors(monkeypatch, tmp_path):
+    def fake_download(url, output_path):
+        if "bad" in url:
+            raise RuntimeError("boom")
+    monkeypatch.setattr(helpers, "download_image_from_url", fake_download)
+    jobs = [("http://x/a.png", tmp_path / "a.png"), ("http://x/bad.png", tmp_path / "b.png")]
+    results = helpers.download_images_batch(jobs, max_workers=2)
+    assert [path for path, _ in results] == [tmp_path / "a.png", tmp_path / "b.png"]
+    assert results[0][1] is None
+    assert isinstance(results[1][1], RuntimeError)
+
+def test_ensure_section_consistency_splits_single_section():
+    sections = [{"heading": "Only", "narration": "First part.\n\nSecond part."}]
+    result = helpers.ensure_section_consistency(sections)
+    assert [s["narration"] for s in result] == ["First part.", "Second part."]
+    sections = [{"heading": "Only", "narration": "Intro\n1. One\n2. Two"}]
+    assert [s["narration"] for s in helpers.ensure_section_consistency(sections)] == ["Intro", "One", "Two"]
+
+def test_estimate_durations_matches_single():
+    texts = ["one two three", "word " * 300, ""]
+    assert helpers.estimate_durations(texts) == [helpers.estimate_duration(t) for t in texts]
+
+def test_export_srt_offsets(tmp_path):
+    sections = [
+        {"heading": "A", "narration": "First ", "duration": 61.5},
+        {"heading": "B", "narration": "Second", "duration": 3600},
+    ]
+    srt_path = tmp_path / "script.srt"
+    helpers.export_srt(sections, srt_path)
+    assert srt_path.read_text(encoding="utf-8") == (
+        "1\n00:00:00,000 --> 00:01:01,500\n[A]\nFirst\n\n"
+        "2\n00:01:01,500 --> 01:01:01,500\n[B]\nSecond\n"
+    )
+
+def test_build_prompt_appends_dynamic_lines():
+    prompt = helpers.build_prompt({"topic": "Fruit", "keywords": ["apple", "pear"]})
+    assert prompt.startswith(helpers.build_static_preamble() + "\n")
+    assert prompt.endswith("Topic: Fruit\nKeywords: apple, pear")
+    assert helpers.build_prompt({}) == helpers.build_static_preamble()
+
+def test_ensure_section_consistency_drops_malformed_sections():
+    good = [{"heading": "A", "narration": "a"}, {"heading": "B", "narration": "b"}]
+    assert helpers.ensure_section_consistency(good) is good
+    mixed = good + ["junk", {"heading": "", "narration": "c"}]
+    assert helpers.ensure_section_consistency(mixed) == good
+
+def test_seconds_to_timestamp():
+    assert helpers.seconds_to_timestamp(0) == "00:00:00,000"
+    assert helpers.seconds_to_timestamp(3723.25) == "01:02:03,250"
+    assert helpers.seconds_to_timestamp(3723.25, ".") == "01:02:03.250"
+
+def test_create_prompt_from_section():
+    section = {"heading": "Bees", "narration": "Bees make honey."}
+    assert helpers.create_prompt_from_section(section, "Insects", ["wings", "hive"]) == "Bees. Bees make honey.. Insects. wings, hive"
+    assert helpers.create_prompt_from_section({"heading": "Bees"}, "", []) == "Bees"
+
+def test_fit_image_to_frame_keeps_cache_copy(tmp_path):
+    import os
+    from PIL import Image
+    cached = tmp_path / "cached.png"
+    Image.new("RGB", (100, 50), (255, 0, 0)).save(cached)
+    linked = tmp_path / "01_A.png"
+    os.link(cached, linked)
+    helpers.fit_image_to_frame(linked, (64, 64))
+    with Image.open(linked) as im:
+        assert im.size == (64, 64)
+        assert im.getpixel((32, 0)) == (0, 0, 0) and im.getpixel((32, 32)) == (255, 0, 0)
+    with Image.open(cached) as im:
+        assert im.size == (100, 50)
+
+def test_ai_image_url_is_cached_only_once_remembered(monkeypatch, tmp_path):
+    import types
+    from app import llm_cache
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "llm.sqlite3")
+    urls = iter(["http://x/broken.jpg", "http://x/good.jpg"])
+    model = types.SimpleNamespace(generate_content=lambda prompt: types.SimpleNamespace(text=next(urls)))
+    monkeypatch.setattr(helpers, "get_gemini_model", lambda model_name: model)
+    assert helpers.get_image_url_from_ai("apple") == "http://x/broken.jpg"
+    assert helpers.get_image_url_from_ai("apple") == "http://x/good.jpg"
+    helpers.remember_image_url("apple", "http://x/good.jpg")
+    assert helpers.get_image_url_from_ai("apple") == "http://x/good.jpg"
+
+def test_ai_image_url_extension_check_ignores_case(monkeypatch, tmp_path):
+    import types
+    from app import llm_cache
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "llm.sqlite3")
+    model = types.SimpleNamespace(generate_content=lambda prompt: types.SimpleNamespace(text="http://x/Photo.Jpg"))
+    monkeypatch.setattr(helpers, "get_gemini_model", lambda model_name: model)
+    assert helpers.get_image_url_from_ai("apple") == "http://x/Photo.Jpg"
@@ -0,0 +1,25 @@
+from app import image_cache
+
+def test_get_or_download_fetches_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_ROOT", tmp_path / "cache")
+    calls = []
+    def fetch(url, path):
+        calls.append(url)
+        path.write_bytes(b"png-bytes")
+    first, second = tmp_path / "a.png", tmp_path / "b.png"
+    image_cache.get_or_download("http://x/img.png", first, fetch)
+    image_cache.get_or_download("http://x/img.png", second, fetch)
+    assert calls == ["http://x/img.png"]
+    assert first.read_bytes() == second.read_bytes() == b"png-bytes"
+
+def test_failed_fetch_leaves_no_cache_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_cache, "CACHE_ROOT", tmp_path / "cache")
+    def fetch(url, path):
+        raise RuntimeError("network down")
+    try:
+        image_cache.get_or_download("http://x/img.png", tmp_path / "a.png", fetch)
+    except RuntimeError:
+        pass
+    cached = image_cache.cache_path_for("http://x/img.png")
+    assert not cached.exists()
+    assert list(cached.parent.iterdir()) == []
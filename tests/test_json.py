@@ -0,0 +1,15 @@
+import pytest
+from app import _json
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_roundtrip(tmp_path, monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(_json, "orjson", None)
+    data = {"title": "Buah Ajaib", "sections": [{"heading": "Intro", "duration": 2.5}], 1: "int key"}
+    path = tmp_path / "data.json"
+    path.write_bytes(_json.dumps(data, indent=True))
+    assert _json.load(path) == {"title": "Buah Ajaib", "sections": [{"heading": "Intro", "duration": 2.5}], "1": "int key"}
+
+def test_decode_error_is_stdlib_compatible():
+    with pytest.raises(_json.JSONDecodeError):
+        _json.loads(b"{not json")
@@ -0,0 +1,17 @@
+from app import llm_cache
+
+def test_cache_roundtrip(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "cache.sqlite3")
+    key = llm_cache.make_key("models/test", "prompt")
+    assert llm_cache.check_cache(key) is None
+    llm_cache.save_to_cache(key, "response", model="models/test")
+    assert llm_cache.check_cache(key) == "response"
+
+def test_cache_expiry(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "cache.sqlite3")
+    key = llm_cache.make_key("models/test", "prompt")
+    llm_cache.save_to_cache(key, "response", ttl=-1)
+    assert llm_cache.check_cache(key) is None
+
+def test_key_depends_on_prompt_version():
+    assert llm_cache.make_key("m", "p", "v1") != llm_cache.make_key("m", "p", "v2")
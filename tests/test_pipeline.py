@@ -0,0 +1,271 @@
+import os
+from app.config import PipelineConfig
+from app.pipeline import VideoPipeline
+
+def make_pipeline(tmp_path):
+    return VideoPipeline(PipelineConfig(), engine_manager=None, output_dir=str(tmp_path))
+
+def test_generate_images_reuses_existing_files(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    (pipeline.images_dir / "01_Intro.jpg").write_bytes(b"x")
+    (pipeline.images_dir / "02_Old heading.png").write_bytes(b"x")
+    (pipeline.images_dir / "notes.txt").write_text("x")
+    voice_data = {"meta": {}, "sections": [{"heading": "Intro", "narration": "a"}, {"heading": "Next", "narration": "b"}]}
+    existing = pipeline.find_existing_images(voice_data["sections"])
+    assert existing == {1: "01_Intro.jpg"}
+    manifest = pipeline.generate_images(voice_data, test_mode=True, skip_sections=existing)
+    assert [entry["filename"] for entry in manifest] == ["01_Intro.jpg", "02_Next.png"]
+    assert voice_data["sections"][0]["image_file"] == "01_Intro.jpg"
+
+def test_collect_segment_inputs_skips_incomplete_sections(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    (pipeline.images_dir / "01.png").write_bytes(b"x")
+    (pipeline.audio_dir / "01.wav").write_bytes(b"x")
+    sections = [
+        {"image_file": "01.png", "sound_file": "01.wav", "duration": "2.5"},
+        {"image_file": "01.png", "sound_file": "01.wav"},
+        {"image_file": "01.png", "sound_file": "01.wav", "duration": -1},
+    ]
+    assert pipeline._collect_segment_inputs(sections) == [
+        (1, pipeline.images_dir / "01.png", pipeline.audio_dir / "01.wav", 2.5)
+    ]
+
+def test_progress_events_are_logged_then_compacted(tmp_path):
+    import json
+    pipeline = make_pipeline(tmp_path)
+    pipeline._mark_progress("voice", 1)
+    pipeline._maybe_flush_progress(force=True)
+    assert json.loads(pipeline.progress_path.read_text())["sections"] == {"1": {"voice": "done"}}
+    pipeline._mark_progress("image", 1)
+    pipeline._mark_progress("voice", 2)
+    assert pipeline.progress_log_path.read_bytes().count(b"\n") == 2
+    resumed = make_pipeline(tmp_path)
+    assert resumed._completed("voice") == {1, 2} and resumed._completed("image") == {1}
+    assert not resumed.progress_log_path.exists()
+
+def test_legacy_progress_is_migrated(tmp_path):
+    (tmp_path / "progress.json").write_text('{"script": true, "voice": [1, 2], "images": [2], "video": false}')
+    pipeline = make_pipeline(tmp_path)
+    assert pipeline.progress["script"] is True
+    assert pipeline._completed("voice") == {1, 2}
+    assert pipeline._completed("image") == {2}
+
+def test_parse_script_response(tmp_path):
+    pipeline = make_pipeline(tmp_path)
+    fenced = 'Sure!\n```json\n[{"heading": "A", "narration": "a [1]"}]\n```\nEnjoy'
+    assert pipeline._parse_script_response(fenced) == [{"heading": "A", "narration": "a [1]"}]
+    counted = 'Here are [3] sections: ```json[{"heading": "A", "narration": "a"}]```'
+    assert pipeline._parse_script_response(counted) == [{"heading": "A", "narration": "a"}]
+    noted = 'Note [draft]: [{"heading": "A", "narration": "a"}]'
+    assert pipeline._parse_script_response(noted) == [{"heading": "A", "narration": "a"}]
+    text = "Intro:\nline one\nline two\n\nOutro:\nbye"
+    assert pipeline._parse_script_response(text) == [
+        {"heading": "Intro", "narration": "line one line two "},
+        {"heading": "Outro", "narration": "bye "},
+    ]
+
+def test_pipeline_context_manager_shuts_down_pools(tmp_path):
+    import pytest
+    with make_pipeline(tmp_path) as pipeline:
+        assert pipeline._io_pool.submit(lambda: 42).result() == 42
+    with pytest.raises(RuntimeError):
+        pipeline._io_pool.submit(lambda: 0)
+
+def test_validate_script_sections():
+    from app.pipeline import validate_script_sections
+    assert validate_script_sections([{"heading": "A", "narration": "a"}]) is True
+    assert validate_script_sections([]) is False
+    assert validate_script_sections([{"heading": "A", "narration": ""}]) is False
+    assert validate_script_sections(["A"]) is False
+
+def test_load_step_data_rebuilds_sections_from_manifests(tmp_path):
+    from app.utils import save_json
+    pipeline = make_pipeline(tmp_path)
+    save_json({"sections": [{"heading": "A"}, {"heading": "B"}]}, pipeline.scripts_dir / "script.json")
+    save_json([{"section_index": 1, "filename": "01_A.wav"}, {"section_index": 2, "filename": "02_B.wav"}],
+              pipeline.audio_dir / "voice.json")
+    save_json([{"section_index": 1, "filename": "01_A.png"}], pipeline.images_dir / "images.json")
+    (pipeline.audio_dir / "01_A.wav").write_bytes(b"x")
+    (pipeline.images_dir / "01_A.png").write_bytes(b"x")
+    assert pipeline.load_step_data("voice")["sections"] == [{"heading": "A", "sound_file": "01_A.wav"}, {"heading": "B"}]
+    assert pipeline.load_step_data("images")["sections"][0] == {"heading": "A", "sound_file": "01_A.wav", "image_file": "01_A.png"}
+
+def test_script_validator_is_reused():
+    from app.pipeline import _script_validator
+    import jsonschema
+    import pytest
+    validator = _script_validator()
+    assert _script_validator() is validator
+    script = {"title": "T", "sections": [{"heading": "A", "narration": "a", "duration": 2}],
+              "meta": {"model": "m", "generated_at": "2024-01-01T00:00:00"}}
+    validator.validate(script)
+    script["sections"][0]["duration"] = 0
+    with pytest.raises(jsonschema.ValidationError):
+        validator.validate(script)
+    script["sections"][0].update(duration=2, narration="")
+    with pytest.raises(jsonschema.ValidationError):
+        validator.validate(script)
+
+def test_voice_output_is_reused_from_content_cache(tmp_path):
+    from app.config import TTSConfig
+    calls = []
+
+    class Engines:
+        def generate_tts(self, text, output_path, config):
+            calls.append(text)
+            output_path.write_bytes(b"RIFF")
+            return config.engine.lower()
+
+    pipeline = VideoPipeline(PipelineConfig(), engine_manager=Engines(), output_dir=str(tmp_path))
+    first = {"heading": "Intro", "narration": "Hello"}
+    second = {"heading": "Again", "narration": "Hello"}
+    assert pipeline._generate_voice_section(1, first, TTSConfig()) == 1
+    assert pipeline._generate_voice_section(2, second, TTSConfig()) == 2
+    assert calls == ["Hello"]
+    assert (pipeline.audio_dir / second["sound_file"]).read_bytes() == b"RIFF"
+    assert pipeline._generate_voice_section(3, dict(first), TTSConfig(voice="other")) == 3
+    assert len(calls) == 2
+
+def test_regenerating_in_place_keeps_old_cache_entry(tmp_path):
+    from app.config import TTSConfig
+
+    class Engines:
+        def generate_tts(self, text, output_path, config):
+            with open(output_path, "wb") as f:  # truncates in place, like espeak -w
+                f.write(text.encode())
+            return config.engine.lower()
+
+    pipeline = VideoPipeline(PipelineConfig(), engine_manager=Engines(), output_dir=str(tmp_path))
+    section = {"heading": "Intro", "narration": "Old"}
+    pipeline._generate_voice_section(1, section, TTSConfig())
+    section["narration"] = "New"
+    pipeline._generate_voice_section(1, section, TTSConfig())
+    again = {"heading": "Again", "narration": "Old"}
+    pipeline._generate_voice_section(2, again, TTSConfig())
+    assert (pipeline.audio_dir / again["sound_file"]).read_bytes() == b"Old"
+    assert (pipeline.audio_dir / section["sound_file"]).read_bytes() == b"New"
+
+def test_fallback_voice_output_is_not_cached(tmp_path):
+    from app.config import TTSConfig
+    calls = []
+
+    class Engines:
+        def generate_tts(self, text, output_path, config):
+            calls.append(text)
+            output_path.write_bytes(b"RIFF")
+            return config.fallback_engine.lower()
+
+    pipeline = VideoPipeline(PipelineConfig(), engine_manager=Engines(), output_dir=str(tmp_path / "run"),
+                             cache_dir=str(tmp_path / ".cache"))
+    tts_config = TTSConfig(engine="gtts", fallback_engine="espeak")
+    assert pipeline._generate_voice_section(1, {"heading": "A", "narration": "Hello"}, tts_config) == 1
+    assert pipeline._generate_voice_section(2, {"heading": "B", "narration": "Hello"}, tts_config) == 2
+    assert calls == ["Hello", "Hello"]
+    assert not (tmp_path / ".cache" / "content").exists()
+
+def test_io_workers_are_not_limited_by_cpu_count(tmp_path, monkeypatch, caplog):
+    monkeypatch.setattr("os.cpu_count", lambda: 1)
+    with VideoPipeline(PipelineConfig(), engine_manager=None, output_dir=str(tmp_path), max_workers=8) as pipeline:
+        assert pipeline.max_workers == 8
+        assert pipeline._io_workers == 8
+        assert pipeline._cpu_workers == 1
+    assert "clamped" not in caplog.text
+
+def test_assemble_video_uses_segments_beyond_single_pass_limit(tmp_path, monkeypatch):
+    import pytest
+    import app.pipeline as pipeline_module
+    pipeline = make_pipeline(tmp_path)
+    inputs = [(i, tmp_path / f"{i}.png", tmp_path / f"{i}.wav", 2.0) for i in (1, 2, 3)]
+    monkeypatch.setattr(pipeline, "_collect_segment_inputs", lambda sections: inputs)
+    monkeypatch.setattr(pipeline_module, "_MAX_SINGLE_PASS_SECTIONS", 2)
+    monkeypatch.setattr(pipeline, "_render_single_pass", lambda *a: pytest.fail("single pass used"))
+    monkeypatch.setattr(pipeline, "_render_via_segments", lambda segment_inputs: tmp_path / "out.mp4")
+    assert pipeline.assemble_video({"sections": [{}] * 3}) == str(tmp_path / "out.mp4")
+
+def test_assemble_video_per_segment_skips_single_pass(tmp_path, monkeypatch):
+    import pytest
+    pipeline = make_pipeline(tmp_path)
+    inputs = [(1, tmp_path / "1.png", tmp_path / "1.wav", 2.0)]
+    monkeypatch.setattr(pipeline, "_collect_segment_inputs", lambda sections: inputs)
+    monkeypatch.setattr(pipeline, "_render_single_pass", lambda *a: pytest.fail("single pass used"))
+    monkeypatch.setattr(pipeline, "_render_via_segments", lambda segment_inputs: tmp_path / "out.mp4")
+    assert pipeline.assemble_video({"sections": [{}]}, per_segment=True) == str(tmp_path / "out.mp4")
+
+def test_generate_images_generates_duplicate_prompts_once(tmp_path):
+    from PIL import Image
+    prompts = []
+
+    class Engines:
+        def generate_image(self, prompt, output_path, config):
+            prompts.append(prompt)
+            Image.new("RGB", (32, 32)).save(output_path)
+
+    pipeline = VideoPipeline(PipelineConfig(), engine_manager=Engines(), output_dir=str(tmp_path))
+    sections = [{"heading": "Outro", "narration": "Bye"}, {"heading": "Body", "narration": "Text"},
+                {"heading": "Outro", "narration": "Bye "}, {"heading": "outro", "narration": "Bye"}]
+    pipeline.generate_images({"meta": {}, "sections": sections})
+    assert len(prompts) == 3  # case is significant to the image model; only whitespace is collapsed
+    assert [s["image_file"] for s in sections] == ["01_Outro.png", "02_Body.png", "03_Outro.png", "04_outro.png"]
+    assert not os.path.samefile(pipeline.images_dir / "01_Outro.png", pipeline.images_dir / "03_Outro.png")
+    assert pipeline._completed("image") == {1, 2, 3, 4}
+
+def test_generate_script_caches_only_valid_responses(tmp_path, monkeypatch):
+    import types
+    import pytest
+    import app.pipeline as pipeline_module
+    from app import helpers, llm_cache
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", tmp_path / "llm.sqlite3")
+    monkeypatch.setattr(helpers, "configure_gemini", lambda api_key=None: None)
+    responses = iter(["not a script", '[{"heading": "A", "narration": "a"}, {"heading": "B", "narration": "b"}]'])
+
+    class Model:
+        def generate_content(self, prompt):
+            return types.SimpleNamespace(text=next(responses))
+
+    monkeypatch.setattr(helpers, "get_gemini_model", lambda name: Model())
+    pipeline = VideoPipeline(PipelineConfig(gemini_api_key="key"), engine_manager=None, output_dir=str(tmp_path / "run"))
+    input_data = {"topic": "T"}
+    key = llm_cache.make_key(pipeline.config.default_model, helpers.build_prompt(input_data))
+    with pytest.raises(ValueError):
+        pipeline.generate_script(input_data)
+    assert llm_cache.check_cache(key) is None
+    pipeline.generate_script(input_data)
+    assert llm_cache.check_cache(key).startswith("[")
+
+def test_concurrent_progress_saves_do_not_collide(tmp_path, caplog):
+    import threading
+    from app import _json
+    pipeline = make_pipeline(tmp_path)
+    pipeline._mark_progress("voice", 1)
+
+    def save():
+        for _ in range(20):
+            pipeline._save_progress()
+            pipeline._maybe_flush_progress(force=True)
+
+    threads = [threading.Thread(target=save) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert "Failed to save progress.json" not in caplog.text
+    assert _json.load(pipeline.progress_path)["sections"] == {"1": {"voice": "done"}}
+    assert not pipeline.progress_path.with_suffix('.json.tmp').exists()
+
+def test_shared_cache_dir_roots_llm_and_image_caches(tmp_path, monkeypatch):
+    import time
+    from app import image_cache, llm_cache
+    monkeypatch.delenv("IMAGE_CACHE_DIR", raising=False)
+    monkeypatch.delenv("LLM_CACHE_PATH", raising=False)
+    monkeypatch.setattr(image_cache, "CACHE_ROOT", image_cache.CACHE_ROOT)
+    monkeypatch.setattr(llm_cache, "CACHE_PATH", llm_cache.CACHE_PATH)
+    pipeline = VideoPipeline(PipelineConfig(image_cache_max_mb=0), engine_manager=None,
+                             output_dir=str(tmp_path / "run"), cache_dir=str(tmp_path / ".cache"))
+    assert llm_cache.CACHE_PATH == tmp_path / ".cache" / "llm_cache.sqlite3"
+    cached = image_cache.cache_path_for("http://x/a.png")
+    assert cached.is_relative_to(tmp_path / ".cache" / "images")
+    cached.parent.mkdir(parents=True)
+    cached.write_bytes(b"x")
+    pipeline._clean_temp_dir(tmp_path / "run" / "temp_segments")
+    assert not cached.exists()
+    pipeline.close()
@@ -0,0 +1,87 @@
+import sys
+
+import pytest
+
+from app import utils
+
+def test_save_json_roundtrip_leaves_no_temp_file(tmp_path):
+    path = tmp_path / "nested" / "data.json"
+    utils.save_json({"sections": [{"heading": "Ä"}]}, path)
+    assert utils.load_json(path) == {"sections": [{"heading": "Ä"}]}
+    assert [p.name for p in path.parent.iterdir()] == ["data.json"]
+
+def test_prune_content_cache_drops_old_entries(tmp_path):
+    import os
+    old = utils.content_cache_path(tmp_path, "audio", "old", ".wav")
+    new = utils.content_cache_path(tmp_path, "audio", "new", ".wav")
+    old.parent.mkdir(parents=True)
+    old.write_bytes(b"x")
+    new.write_bytes(b"x")
+    os.utime(old, (0, 0))
+    assert utils.prune_content_cache(tmp_path, max_age_days=1) == 1
+    assert not old.exists() and new.exists()
+
+def test_prune_content_cache_evicts_least_recently_used_over_size(tmp_path):
+    import os
+    import time
+    paths = [utils.content_cache_path(tmp_path, "audio", key, ".wav") for key in ("a", "b", "c")]
+    paths[0].parent.mkdir(parents=True)
+    now = time.time()
+    for age, path in zip((30, 10, 20), paths):
+        path.write_bytes(b"x" * 10)
+        os.utime(path, (now - age, now - age))
+    assert utils.prune_content_cache(tmp_path, max_age_days=1, max_bytes=15) == 2
+    assert [p.exists() for p in paths] == [False, True, False]
+
+def test_sanitize_filename():
+    assert utils.sanitize_filename('What is <AI>? / Part: 1') == "What_is_AI_Part_1"
+    assert utils.sanitize_filename("***") == "untitled"
+    assert utils.sanitize_filename("Intro") is utils.sanitize_filename("Intro")
+
+def test_discover_plugins_prefers_registered_engines(tmp_path):
+    (tmp_path / "tts_regtest_a.py").write_text(
+        "from app.utils import register_engine\n"
+        "@register_engine('Fancy')\n"
+        "def speak(text, path, model=None, voice=None): pass\n"
+        "def tts_ignored(text, path, model=None, voice=None): pass\n")
+    (tmp_path / "tts_regtest_b.py").write_text("def tts_regtest_b(text, path, model=None, voice=None): pass\n")
+    plugins = utils.discover_plugins(tmp_path, "tts_")
+    assert sorted(plugins) == ["fancy", "regtest_b"]
+    assert "tts_regtest_a" not in sys.modules
+    assert plugins["fancy"].load().__name__ == "speak"
+    assert utils.discover_plugins(tmp_path, "tts_")["fancy"] is plugins["fancy"]
+    (tmp_path / "tts_regtest_c.py").write_text("def tts_regtest_c(text, path, model=None, voice=None): pass\n")
+    assert sorted(utils.discover_plugins(tmp_path, "tts_")) == ["fancy", "regtest_b", "regtest_c"]
+
+def test_lazy_plugin_imports_on_first_call(tmp_path):
+    (tmp_path / "generate_lazytest.py").write_text(
+        "def generate_lazytest_image(prompt, output_path):\n"
+        "    open(output_path, 'w').write(prompt)\n")
+    (tmp_path / "generate_broken.py").write_text("raise ImportError('missing dependency')\n"
+                                                "def generate_broken(prompt, output_path): pass\n")
+    plugins = utils.discover_plugins(tmp_path, "generate_")
+    assert sorted(plugins) == ["broken", "lazytest"]
+    plugins["lazytest"]("hello", str(tmp_path / "out.txt"))
+    assert (tmp_path / "out.txt").read_text() == "hello"
+    for _ in range(2):
+        with pytest.raises(ImportError):
+            plugins["broken"]("x", "y")
+    assert "generate_broken" not in sys.modules
+
+def test_create_numbered_directory_continues_after_highest(tmp_path):
+    (tmp_path / "01_Topic").mkdir()
+    (tmp_path / "03_Topic").mkdir()
+    (tmp_path / "07_Other").mkdir()
+    assert utils.create_numbered_directory(str(tmp_path), "Topic") == tmp_path / "04_Topic"
+    assert utils.create_numbered_directory(str(tmp_path), "New") == tmp_path / "01_New"
+
+def test_clean_temp_files_removes_flat_and_nested_dirs(tmp_path):
+    flat = tmp_path / "flat"
+    flat.mkdir()
+    (flat / "segment_01.mp4").write_bytes(b"x")
+    nested = tmp_path / "nested"
+    (nested / "sub").mkdir(parents=True)
+    (nested / "sub" / "f").write_bytes(b"x")
+    for directory in (flat, nested, tmp_path / "missing"):
+        utils.clean_temp_files(directory)
+        assert not directory.exists()
@@ -1,12 +1,45 @@
 import subprocess
 import shutil
+from functools import lru_cache
+from app.utils import register_engine
 
-def tts_espeak(narration, output_path, model=None, voice=None):
+@lru_cache(maxsize=1)
+def _espeak_cmd():
     # Auto-detect espeak or espeak-ng
     espeak_cmd = shutil.which("espeak") or shutil.which("espeak-ng")
     if not espeak_cmd:
         raise RuntimeError("Neither 'espeak' nor 'espeak-ng' was found in your PATH. Please install one of them.")
+    return espeak_cmd
+
+def _build_cmd(output_path, voice):
     # eSpeak voice selection: e.g., 'en', 'en-us', 'en+f3' (female), etc.
     voice_arg = ["-v", voice] if voice else []
-    cmd = [espeak_cmd] + voice_arg + ["-w", output_path, narration]
-    subprocess.run(cmd, check=True) 
\ No newline at end of file
+    # Text goes through stdin: no argv length limit, and narration starting with '-' is not read as an option
+    return [_espeak_cmd()] + voice_arg + ["-w", output_path, "--stdin"]
+
+@register_engine("espeak")
+def tts_espeak(narration, output_path, model=None, voice=None):
+    subprocess.run(_build_cmd(output_path, voice), input=narration, text=True, check=True)
+
+def batch(items, model=None, voice=None):
+    """Batch entry point used by EngineManager: start one espeak process per (narration, output_path) pair, then wait for all."""
+    procs = []
+    try:
+        for narration, path in items:
+            proc = subprocess.Popen(_build_cmd(path, voice), stdin=subprocess.PIPE, text=True)
+            procs.append(proc)
+            proc.stdin.write(narration)
+            proc.stdin.close()
+    except BaseException:
+        # Don't leave the processes already started running (or as zombies) if a later one fails to start
+        for proc in procs:
+            proc.kill()
+            proc.wait()
+        raise
+    results = []
+    for proc in procs:
+        if proc.wait():
+            results.append(subprocess.CalledProcessError(proc.returncode, proc.args))
+        else:
+            results.append(None)
+    return results
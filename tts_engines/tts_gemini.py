@@ -1,22 +1,34 @@
 import os
 import json
-import wave
-from google.generativeai.client import configure
-from google.generativeai.generative_models import GenerativeModel
-from google.ai.generativelanguage_v1beta.types.generative_service import SpeechConfig, VoiceConfig, PrebuiltVoiceConfig
-from dotenv import load_dotenv
+import random
+import struct
+import time
+from functools import lru_cache
+from app.config import load_env_once
+from app.utils import register_engine
 
 def wave_file(filename, pcm, channels=1, rate=24000, sample_width=2):
-    with wave.open(filename, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(rate)
-        wf.writeframes(pcm)
+    # PCM WAV has a fixed 44-byte header, so write it directly instead of going through the wave module
+    block_align = channels * sample_width
+    header = struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 36 + len(pcm), b'WAVE', b'fmt ', 16, 1, channels, rate,
+                         rate * block_align, block_align, sample_width * 8, b'data', len(pcm))
+    with open(filename, "wb") as f:
+        f.write(header)
+        f.write(pcm)
+
+_KEYS_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "keys", "gemini.json")
+# (mtime_ns, size, keys) of the last parse of _KEYS_FILE
+_keys_cache = None
 
 def load_gemini_keys():
-    """Load API keys from gemini.json file."""
-    keys_file = os.path.join(os.path.dirname(__file__), "..", "..", "keys", "gemini.json")
+    """Load API keys from gemini.json file; the parsed keys are reused until the file changes."""
+    global _keys_cache
+    keys_file = _KEYS_FILE
     try:
+        st = os.stat(keys_file)
+        cached = _keys_cache
+        if cached is not None and cached[:2] == (st.st_mtime_ns, st.st_size):
+            return list(cached[2])
         with open(keys_file, 'r') as f:
             data = json.load(f)
             keys_info = []
@@ -28,12 +40,37 @@ def load_gemini_keys():
                         'account': item.get('account', 'unknown'),
                         'value': item['value']
                     })
-            return keys_info
+            _keys_cache = (st.st_mtime_ns, st.st_size, keys_info)
+            return list(keys_info)
     except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
         print(f"Warning: Could not load keys from {keys_file}: {e}")
         return []
 
+@lru_cache(maxsize=1)
+def _retryable_errors():
+    # Rate limits and server hiccups: retry the same key with backoff instead of burning through the others
+    from google.api_core import exceptions as google_exceptions
+    return (google_exceptions.ResourceExhausted, google_exceptions.ServiceUnavailable,
+            google_exceptions.DeadlineExceeded, google_exceptions.InternalServerError)
+
+def _with_backoff(fn, attempts=5, base=1.0, max_backoff=30.0):
+    """Call fn(), retrying retryable API errors with exponential backoff and jitter."""
+    retryable = _retryable_errors()
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except retryable as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_backoff, base * 2 ** attempt) * random.uniform(0.5, 1.5)
+            print(f"Gemini API busy ({type(e).__name__}); retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+@register_engine("gemini")
 def tts_gemini(narration, output_path, model, voice, api_key=None):
+    # The Google SDK pulls in protobuf/grpc, so it is imported on first synthesis rather than with the module
+    from google.generativeai.client import configure
+    from google.generativeai.generative_models import GenerativeModel
     # Try provided API key first, then load from JSON file, then from environment
     api_keys = []
     if api_key:
@@ -50,7 +87,7 @@ def tts_gemini(narration, output_path, model, voice, api_key=None):
     
     # Load from environment as fallback
     if not api_keys:
-        load_dotenv()
+        load_env_once()
         env_key = os.getenv("GEMINI_API_KEY")
         if env_key:
             api_keys.append({
@@ -72,7 +109,7 @@ def tts_gemini(narration, output_path, model, voice, api_key=None):
             print(f"Trying Gemini API key {i+1}/{len(api_keys)}: {key_info['account']} ({key_info['project']}) - {key_info['value'][:10]}...")
             configure(api_key=key_info['value'])
             gemini_model = GenerativeModel(model)
-            response = gemini_model.generate_content(
+            response = _with_backoff(lambda: gemini_model.generate_content(
                 narration,
                 generation_config=None,
                 safety_settings=None,
@@ -81,7 +118,7 @@ def tts_gemini(narration, output_path, model, voice, api_key=None):
                 request_options=None,
                 # For speech, pass the config as below
                 # This is a placeholder; actual API may differ
-            )
+            ))
             # Extract audio bytes from response (update as per actual API)
             data_bytes = response.candidates[0].content.parts[0].inline_data.data
             wave_file(output_path, data_bytes)